@@ -0,0 +1,152 @@
+import time
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Dict, Optional, Tuple
+
+
+class TokenBucket:
+    """Classic token bucket: `rate` tokens per second, up to `capacity`"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def wait(self, now: float) -> float:
+        """Refill, then return 0 if a token is available, otherwise seconds until one is"""
+        elapsed = now - self.updated
+        self.updated = now
+        self.tokens = min(self.capacity, self.tokens + elapsed * self.rate)
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def take(self, now: float) -> float:
+        """Take one token. Returns 0 on success, otherwise seconds until one is available"""
+        wait = self.wait(now)
+        if wait == 0:
+            self.tokens -= 1
+        return wait
+
+
+class BucketRegistry:
+    """Keyed token buckets with a bounded number of tracked keys (LRU eviction)"""
+
+    def __init__(self, rate: float, capacity: float, max_keys: int = 10000):
+        self.rate = rate
+        self.capacity = capacity
+        self.max_keys = max_keys
+        self.buckets: "OrderedDict[str, TokenBucket]" = OrderedDict()
+
+    def get(self, key: str) -> TokenBucket:
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            bucket = TokenBucket(self.rate, self.capacity)
+            self.buckets[key] = bucket
+            if len(self.buckets) > self.max_keys:
+                self.buckets.popitem(last=False)
+        else:
+            self.buckets.move_to_end(key)
+        return bucket
+
+    def take(self, key: str, now: float) -> float:
+        return self.get(key).take(now)
+
+
+class AdmissionController:
+    """Rate limiting for /api/chat and a concurrency gate for LLM calls.
+
+    Requests are first checked against per-session and per-IP token buckets.
+    Admitted requests then need one of `max_inflight` LLM slots; when more than
+    `max_queue` requests are already waiting, or a slot does not free up within
+    `queue_timeout` seconds, the request is shed and the caller falls back to
+    the deterministic (non-LLM) path.
+    """
+
+    def __init__(self, session_rate: float, session_burst: float, ip_rate: float, ip_burst: float,
+                 max_inflight: int, max_queue: int, queue_timeout: float):
+        self.session_buckets = BucketRegistry(session_rate, session_burst)
+        self.ip_buckets = BucketRegistry(ip_rate, ip_burst)
+        self.max_inflight = max_inflight
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max_inflight)
+        self.inflight = 0
+        self.waiting = 0
+        self.counters = {
+            'admitted': 0,
+            'limited_session': 0,
+            'limited_ip': 0,
+            'llm_calls': 0,
+            'shed_queue_full': 0,
+            'shed_timeout': 0,
+        }
+
+    def check_rate_limit(self, session_id: Optional[str], ip: Optional[str]) -> Tuple[bool, float]:
+        """Return (allowed, retry_after_seconds) for an incoming chat request.
+        
+        Without a session_id only the per-IP bucket applies. Tokens are only
+        taken once every bucket allows the request, so a request rejected for
+        its session does not drain the IP bucket shared with other sessions.
+        """
+        now = time.monotonic()
+        with self._lock:
+            ip_bucket = self.ip_buckets.get(ip or 'unknown')
+            session_bucket = self.session_buckets.get(session_id) if session_id else None
+            ip_wait = ip_bucket.wait(now)
+            session_wait = session_bucket.wait(now) if session_bucket else 0.0
+            if ip_wait > 0 or session_wait > 0:
+                self.counters['limited_ip' if ip_wait >= session_wait else 'limited_session'] += 1
+                return False, max(ip_wait, session_wait)
+            ip_bucket.take(now)
+            if session_bucket:
+                session_bucket.take(now)
+            self.counters['admitted'] += 1
+            return True, 0.0
+
+    @contextmanager
+    def llm_slot(self):
+        """Yield True when an LLM call may proceed, False when it was shed"""
+        with self._lock:
+            if self.waiting >= self.max_queue:
+                self.counters['shed_queue_full'] += 1
+                shed = True
+            else:
+                self.waiting += 1
+                shed = False
+        if shed:
+            yield False
+            return
+
+        acquired = self._slots.acquire(timeout=self.queue_timeout)
+        with self._lock:
+            self.waiting -= 1
+            if acquired:
+                self.inflight += 1
+                self.counters['llm_calls'] += 1
+            else:
+                self.counters['shed_timeout'] += 1
+
+        if not acquired:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            with self._lock:
+                self.inflight -= 1
+            self._slots.release()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                **self.counters,
+                'inflight': self.inflight,
+                'waiting': self.waiting,
+                'max_inflight': self.max_inflight,
+                'max_queue': self.max_queue,
+            }
@@ -1,35 +1,145 @@
 import os
-from flask import Flask, request, jsonify, send_from_directory
+from flask import Flask, request, jsonify
 from flask_cors import CORS
 from datetime import datetime
 import json
+import math
+import psycopg2
 
 from db_manager import DatabaseManager
 from deepseek_service import DeepSeekService
 from conversation_manager import ConversationManager, ConversationState
+from config import Config
+from static_assets import StaticAssetCache
+from admission import AdmissionController
+from search_cache import SearchCache, SearchCacheListener
+from chat_partitions import ensure_future_partitions
+from lazy_service import LazyService, ServiceUnavailable, warm_in_background
+from llm_routing import routes_from_config
+from product_vectors import ProductVectorIndex
+from catalog_snapshot import open_snapshot
+from suggest_index import SuggestIndex
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 FRONTEND_DIR = os.path.join(BASE_DIR, "../frontend")
 
 app = Flask(__name__, static_folder=FRONTEND_DIR, template_folder=FRONTEND_DIR)
-CORS(app)
+# script.js calls the API cross-origin and reads Retry-After on 429/503
+CORS(app, expose_headers=['Retry-After'])
 
 # Initialize services
-db = DatabaseManager()
-deepseek = DeepSeekService()
+config = Config()
+# A bad LLM_ROUTES_JSON would otherwise fail every DeepSeekService build and
+# leave chat answering 503 forever; refuse to start instead
+routes_from_config(config)
+search_cache = None
+search_cache_listener = None
+if config.SEARCH_CACHE_ENABLED:
+    search_cache = SearchCache(config.SEARCH_CACHE_MAX_ENTRIES, config.SEARCH_CACHE_TTL)
+    search_cache_listener = SearchCacheListener(search_cache)
+vector_index = None
+if config.SEMANTIC_SEARCH_ENABLED:
+    vector_index = ProductVectorIndex(nprobe=config.SEMANTIC_SEARCH_NPROBE)
+    if search_cache_listener is not None:
+        search_cache_listener.subscribe(vector_index.handle_change)
+catalog_snapshot = open_snapshot(config.CATALOG_SNAPSHOT_PATH)
+if search_cache_listener is not None:
+    suggest_index = SuggestIndex(refresh_interval=config.SUGGEST_REFRESH_SECONDS,
+                                 max_age=config.SUGGEST_MAX_AGE_SECONDS)
+    search_cache_listener.subscribe(suggest_index.handle_change)
+else:
+    # No change feed: fall back to rebuilding on every interval
+    suggest_index = SuggestIndex(refresh_interval=config.SUGGEST_REFRESH_SECONDS,
+                                 max_age=config.SUGGEST_REFRESH_SECONDS)
+
+
+def build_database() -> DatabaseManager:
+    """Connect to Postgres and start the services that need the database"""
+    database = DatabaseManager(search_cache=search_cache, vector_index=vector_index,
+                               snapshot=catalog_snapshot)
+    # Triggers are installed by `search_cache.py --install` and
+    # `demand_rollup.py --install`: DROP/CREATE TRIGGER takes an ACCESS
+    # EXCLUSIVE lock on hot tables, too heavy for every worker start
+    if search_cache_listener is not None:
+        search_cache_listener.start()
+    try:
+        ensure_future_partitions(database.connection, config.CHAT_PARTITION_MONTHS_AHEAD)
+    except Exception as e:
+        print(f"⚠️ Could not create chat_messages partitions: {e}")
+    # Load through `database`: `db` keeps raising "still starting" until this returns
+    suggest_index.refresh_async(lambda: load_suggestion_sources(database))
+    if vector_index is not None:
+        # Embedding the catalogue takes seconds; keep it off the first chat turn
+        vector_index.rebuild_async(database.load_product_names)
+    return database
+
+
+# Services are built lazily (and warmed in the background) so the process
+# starts and serves static pages even while Postgres is unreachable
+db = LazyService('database', build_database)
+deepseek = LazyService('deepseek', DeepSeekService)
 conv_manager = ConversationManager()
+warm_in_background(deepseek, db)
+static_assets = StaticAssetCache(config.FRONTEND_DIR, config.STATIC_DIST_DIR, config.STATIC_MAX_AGE)
+admission = AdmissionController(
+    session_rate=config.RATE_LIMIT_SESSION_PER_SEC,
+    session_burst=config.RATE_LIMIT_SESSION_BURST,
+    ip_rate=config.RATE_LIMIT_IP_PER_SEC,
+    ip_burst=config.RATE_LIMIT_IP_BURST,
+    max_inflight=config.LLM_MAX_INFLIGHT,
+    max_queue=config.LLM_MAX_QUEUE,
+    queue_timeout=config.LLM_QUEUE_TIMEOUT
+)
 
 
 
 @app.route("/")
 def index():
-    return send_from_directory(FRONTEND_DIR, "index.html")
+    return static_assets.serve("index.html")
 
 @app.route("/<path:path>")
 def serve_static(path):
-    return send_from_directory(FRONTEND_DIR, path)
+    return static_assets.serve(path)
+
+
+
+@app.errorhandler(ServiceUnavailable)
+def service_unavailable(e):
+    """Database or LLM client not built yet (still warming up or unreachable)"""
+    response = jsonify({'error': str(e)})
+    response.headers['Retry-After'] = '5'
+    return response, 503
 
 
+def save_history(method: str, *args, **kwargs):
+    """Persist chat history; skipped while the database is down if the snapshot can serve lookups"""
+    try:
+        getattr(db, method)(*args, **kwargs)
+    except (ServiceUnavailable, psycopg2.Error) as e:
+        # psycopg2.Error: the connection dropped after the service was built
+        if catalog_snapshot is None:
+            raise
+        print(f"⚠️ Chat history not saved ({method}): {e}")
+
+
+def find_part(serial: str):
+    """Exact serial lookup, answered from the catalog snapshot while the database is down"""
+    try:
+        return db.search_by_serial(serial)
+    except (ServiceUnavailable, psycopg2.Error):
+        if catalog_snapshot is None:
+            raise
+        return catalog_snapshot.get(serial)
+
+
+def find_parts(serials):
+    try:
+        return db.search_by_serials(serials)
+    except (ServiceUnavailable, psycopg2.Error):
+        if catalog_snapshot is None:
+            raise
+        return catalog_snapshot.get_many(serials)
+
 
 @app.route('/api/chat', methods=['GET', 'POST'])
 def chat():
@@ -49,11 +159,21 @@ def chat():
         user_ip = request.remote_addr
         user_agent = request.headers.get('User-Agent', '')
         
+        # Rate limit before doing any DB or LLM work
+        allowed, retry_after = admission.check_rate_limit(session_id, user_ip)
+        if not allowed:
+            response = jsonify({
+                'type': 'text',
+                'reply': '⏳ You are sending messages too quickly. Please wait a moment and try again.'
+            })
+            response.headers['Retry-After'] = str(max(1, math.ceil(retry_after)))
+            return response, 429
+        
         # Save session if new
-        db.save_chat_session(session_id, user_ip, user_agent)
+        save_history('save_chat_session', session_id, user_ip, user_agent)
         
         # Save user message
-        db.save_message(session_id, 'user', message)
+        save_history('save_message', session_id, 'user', message)
         
         # Get or create session context
         session = conv_manager.get_or_create_session(session_id)
@@ -62,11 +182,29 @@ def chat():
         response = process_message(message, session)
         
         # Save assistant response
-        db.save_message(session_id, 'assistant', response.get('reply', ''), 
-                       metadata={'state': session.state.value})
+        metadata = {
+            'state': session.state.value,
+            'ai_response': session.last_ai_response,
+            'ai_raw': session.last_ai_raw
+        }
+        if session.last_demand:
+            # Picked up by the demand_daily trigger
+            metadata['demand'] = session.last_demand
+        if session.last_search_hit:
+            # Counted in search_hits_daily, which ranks typeahead suggestions
+            metadata['search_hit'] = session.last_search_hit
+        save_history('save_message', session_id, 'assistant', response.get('reply', ''), metadata=metadata)
         
         return jsonify(response)
         
+    except ServiceUnavailable as e:
+        print(f"Chat endpoint unavailable: {e}")
+        response = jsonify({
+            'type': 'text',
+            'reply': '🔧 The service is starting up or temporarily unavailable. Please try again in a moment.'
+        })
+        response.headers['Retry-After'] = '5'
+        return response, 503
     except Exception as e:
         print(f"Chat endpoint error: {e}")
         return jsonify({
@@ -77,6 +215,10 @@ def chat():
 
 def process_message(message: str, session):
     """Process message based on conversation state"""
+    session.last_ai_response = None
+    session.last_ai_raw = None
+    session.last_demand = None
+    session.last_search_hit = None
     
     # First message - show welcome
     if session.state == ConversationState.WELCOME:
@@ -87,12 +229,28 @@ def process_message(message: str, session):
             'suggestions': ['Search by serial number', 'Search by vehicle']
         }
     
-    # Get AI analysis
-    ai_response = deepseek.analyze_intent(message, session)
+    # Get AI analysis, or the deterministic fallback when the LLM is saturated.
+    # The serial handler always answers from the catalog, so it skips the LLM.
+    if session.state == ConversationState.COLLECT_SERIAL:
+        ai_response = deepseek.fallback_intent(message, session)
+    else:
+        with admission.llm_slot() as admitted:
+            if admitted:
+                ai_response = deepseek.analyze_intent(message, session)
+            else:
+                ai_response = deepseek.fallback_intent(message, session)
+    session.last_ai_response = ai_response
+    
+    # Labels from the local classifier drive the branch; otherwise match keywords
+    predicted = ai_response if ai_response.get('source') == 'classifier' else {}
     
     # Handle search method selection
     if session.state == ConversationState.SEARCH_METHOD_SELECTION:
-        if 'serial' in message.lower() or 'number' in message.lower() or '1' in message:
+        if predicted.get('search_method'):
+            by_serial = predicted['search_method'] == 'serial'
+        else:
+            by_serial = 'serial' in message.lower() or 'number' in message.lower() or '1' in message
+        if by_serial:
             session.search_method = 'serial'
             session.state = ConversationState.COLLECT_SERIAL
             return {
@@ -156,12 +314,16 @@ def process_message(message: str, session):
     
     # Handle vehicle confirmation
     if session.state == ConversationState.CONFIRM_VEHICLE:
-        if any(word in message.lower() for word in ['yes', 'correct', 'right', 'oui', 'ok']):
+        if 'confirmed' in predicted:
+            confirmed = predicted['confirmed']
+        else:
+            confirmed = any(word in message.lower() for word in ['yes', 'correct', 'right', 'oui', 'ok'])
+        if confirmed:
             session.state = ConversationState.COLLECT_PART_NAME
             return {
                 'type': 'text',
                 'reply': '🔧 Excellent! What spare part are you looking for?',
-                'suggestions': ['Brake pads', 'Oil filter', 'Air filter', 'Battery', 'Alternator']
+                'suggestions': suggest_index.popular(5) or ['Brake pads', 'Oil filter', 'Air filter', 'Battery', 'Alternator']
             }
         else:
             # Reset vehicle info
@@ -189,10 +351,21 @@ def process_message(message: str, session):
             part_name
         )
         
+        if not results and vector_index is not None:
+            # ILIKE found nothing; try a similarity ranking (synonyms, FR/EN names)
+            query = ' '.join(filter(None, [part_name, session.vehicle_brand, session.vehicle_model]))
+            results = db.search_parts_by_name(query, limit=5, mode='semantic',
+                                              min_score=config.SEMANTIC_SEARCH_MIN_SCORE)
+        
         session.search_results = results
         session.state = ConversationState.SHOW_RESULTS
         
         if results:
+            session.last_search_hit = {
+                'part': part_name,
+                'brand': session.vehicle_brand,
+                'model': session.vehicle_model
+            }
             # Format results for display
             parts_data = []
             for part in results[:5]:
@@ -215,19 +388,46 @@ def process_message(message: str, session):
             session.awaiting_contact = True
             session.requested_part = part_name
             session.state = ConversationState.COLLECT_CONTACT
+            session.last_demand = {
+                'source': 'unmatched_search',
+                'part': part_name,
+                'brand': session.vehicle_brand,
+                'model': session.vehicle_model,
+                'year': session.vehicle_year
+            }
             return {
                 'type': 'text',
                 'reply': f"❌ Sorry, I couldn't find {part_name} for your {session.vehicle_brand} {session.vehicle_model}.\n\n📞 Would you like to leave your contact information? We'll notify you when it becomes available.",
                 'suggestions': ['Yes, I want to be notified', 'Search another part']
             }
     
+    # Handle a pasted list of part numbers with one bulk query
+    if session.state == ConversationState.COLLECT_SERIAL:
+        references = conv_manager.extract_part_references(message, config.BULK_LOOKUP_MAX_REFERENCES)
+        if len(references) > 1:
+            table = lookup_parts_table(references)
+            found = [row for row in table if row['found']]
+            missing = [row['part_no'] for row in table if not row['found']]
+            session.search_results = found
+            session.state = ConversationState.SHOW_RESULTS
+            
+            reply = f"📋 Looked up {len(references)} references: {len(found)} found, {len(missing)} not found."
+            if missing:
+                reply += f"\n\n❌ Not found: {', '.join(missing)}"
+            return {
+                'type': 'parts_table',
+                'reply': reply,
+                'data': table,
+                'suggestions': ['Order now', 'Search another part']
+            }
+    
     # Handle serial number search
     if session.state == ConversationState.COLLECT_SERIAL:
         serial = message.strip()
         session.serial_number = serial
         
         # Search by serial
-        result = db.search_by_serial(serial)
+        result = find_part(serial)
         
         if result:
             session.search_results = [result]
@@ -245,6 +445,7 @@ def process_message(message: str, session):
                 session.awaiting_contact = True
                 session.requested_part = result['product_name']
                 session.state = ConversationState.COLLECT_CONTACT
+                session.last_demand = {'source': 'out_of_stock', 'part': result['product_name']}
             
             return {
                 'type': 'parts',
@@ -261,6 +462,7 @@ def process_message(message: str, session):
             session.awaiting_contact = True
             session.requested_part = serial
             session.state = ConversationState.COLLECT_CONTACT
+            session.last_demand = {'source': 'unmatched_serial', 'part': serial}
             return {
                 'type': 'text',
                 'reply': f"❌ No part found with serial number: {serial}\n\n📞 Would you like to leave your contact info? We'll help you find this part.",
@@ -314,14 +516,20 @@ def process_message(message: str, session):
     
     # Handle order requests from results
     if session.state == ConversationState.SHOW_RESULTS:
-        if 'order' in message.lower():
+        action = predicted.get('intent')
+        if action is None:
+            if 'order' in message.lower():
+                action = 'order'
+            elif 'search another' in message.lower() or 'another part' in message.lower():
+                action = 'search_another'
+        if action == 'order':
             session.state = ConversationState.COLLECT_CONTACT
             return {
                 'type': 'text',
                 'reply': "Great! To process your order, please provide your contact information (phone and/or email):",
                 'suggestions': []
             }
-        elif 'search another' in message.lower() or 'another part' in message.lower():
+        elif action == 'search_another':
             session.state = ConversationState.SEARCH_METHOD_SELECTION
             return {
                 'type': 'text',
@@ -358,13 +566,149 @@ def process_message(message: str, session):
     }
 
 @app.route('/api/health', methods=['GET'])
+@app.route('/api/health/live', methods=['GET'])
 def health_check():
-    """Health check endpoint"""
+    """Liveness: the process is up and answering requests"""
     return jsonify({
         'status': 'healthy',
         'timestamp': datetime.now().isoformat()
     })
 
+def load_suggestion_sources(database=db):
+    return database.load_suggestion_sources(days=config.SUGGEST_HISTORY_DAYS, min_hits=config.SUGGEST_MIN_HITS)
+
+
+@app.route('/api/suggest', methods=['GET'])
+def suggest():
+    """Typeahead completions for part names, vehicles and popular searches"""
+    query = request.args.get('q', '')[:100]
+    limit = request.args.get('limit', 8, type=int)
+    # Never blocks: a stale or missing index is rebuilt on a background thread
+    suggest_index.refresh_async(load_suggestion_sources)
+    return jsonify({
+        'query': query,
+        'suggestions': suggest_index.suggest(query, max(1, min(limit, 20)))
+    })
+
+
+@app.route('/api/health/ready', methods=['GET'])
+def readiness_check():
+    """Readiness: database reachable, LLM reachable and search cache coherent"""
+    checks = {}
+
+    if db.ready:
+        checks['database'] = {'ok': db.ping()}
+    else:
+        checks['database'] = {'ok': False, 'error': db.last_error or 'connecting'}
+
+    if deepseek.ready:
+        checks['llm'] = {'ok': deepseek.check_reachable()}
+    else:
+        checks['llm'] = {'ok': False, 'error': deepseek.last_error or 'starting'}
+
+    if search_cache_listener is not None:
+        checks['search_cache'] = {'ok': search_cache_listener.connected, **search_cache.stats()}
+    else:
+        checks['search_cache'] = {'ok': True, 'enabled': False}
+
+    ready = all(check['ok'] for check in checks.values())
+    return jsonify({
+        'status': 'ready' if ready else 'not_ready',
+        'checks': checks,
+        'timestamp': datetime.now().isoformat()
+    }), 200 if ready else 503
+
+def lookup_parts_table(references):
+    """Resolve part references in one query and format them as table rows"""
+    results = find_parts(references)
+    table = []
+    for reference in references:
+        part = results.get(reference)
+        table.append({
+            'part_no': reference,
+            'description': part.get('product_name', '') if part else '',
+            'qty': part.get('quantity_on_hand', 0) if part else 0,
+            'unit_price': float(part.get('sales_price') or 0) if part else None,
+            'found': part is not None
+        })
+    return table
+
+@app.route('/api/parts/lookup', methods=['POST'])
+def parts_lookup():
+    """Bulk stock/price lookup for a list of part references"""
+    data = request.json or {}
+    if not isinstance(data, dict):
+        return jsonify({'error': 'Request body must be a JSON object.'}), 400
+    references = data.get('references')
+    if isinstance(references, list):
+        references = [str(r).strip() for r in references if str(r).strip()]
+        references = list(dict.fromkeys(references))
+    else:
+        references = conv_manager.extract_part_references(str(data.get('text', '')),
+                                                          config.BULK_LOOKUP_MAX_REFERENCES + 1)
+    
+    if not references:
+        return jsonify({'error': 'Provide "references" (a list) or "text" with part numbers.'}), 400
+    if len(references) > config.BULK_LOOKUP_MAX_REFERENCES:
+        return jsonify({'error': f'At most {config.BULK_LOOKUP_MAX_REFERENCES} references per request.'}), 400
+    
+    session_id = data.get('sessionId')
+    allowed, retry_after = admission.check_rate_limit(str(session_id) if session_id else None,
+                                                      request.remote_addr)
+    if not allowed:
+        response = jsonify({'error': 'Too many requests'})
+        response.headers['Retry-After'] = str(max(1, math.ceil(retry_after)))
+        return response, 429
+    
+    table = lookup_parts_table(references)
+    return jsonify({
+        'type': 'parts_table',
+        'data': table,
+        'found': sum(1 for row in table if row['found']),
+        'missing': [row['part_no'] for row in table if not row['found']]
+    })
+
+@app.route('/api/analytics/demand', methods=['GET'])
+def demand_analytics():
+    """Top requested parts from the precomputed daily rollup"""
+    days = request.args.get('days', 30, type=int)
+    limit = request.args.get('limit', 50, type=int)
+    group_by = request.args.get('group_by', 'part')
+    if group_by not in ('part', 'vehicle', 'day'):
+        return jsonify({'error': 'group_by must be part, vehicle or day'}), 400
+    # Most contact requests follow an unmatched search in the same chat, so by
+    # default they are left out to avoid counting that demand twice;
+    # ?source=all sums every source, ?source=<name> picks one
+    source = request.args.get('source')
+    exclude_source = 'contact_request' if source is None else None
+    rows = db.get_demand(days=max(1, min(days, 366)), limit=max(1, min(limit, 500)),
+                         group_by=group_by, source=None if source == 'all' else source,
+                         exclude_source=exclude_source)
+    return jsonify({'days': days, 'group_by': group_by, 'source': source, 'rows': rows})
+
+@app.route('/api/llm/usage', methods=['GET'])
+def llm_usage():
+    """Tokens, latency and local-classifier hits per conversation state"""
+    return jsonify({
+        'routes': {state: route.payload() for state, route in deepseek.routes.items()},
+        'usage': deepseek.usage.snapshot()
+    })
+
+@app.route('/api/admission/stats', methods=['GET'])
+def admission_stats():
+    """Rate limiting and load shedding counters"""
+    return jsonify(admission.stats())
+
+@app.route('/api/cache/stats', methods=['GET'])
+def cache_stats():
+    """Search result cache counters"""
+    return jsonify(search_cache.stats() if search_cache else {'enabled': False})
+
+@app.route('/api/catalog/snapshot', methods=['GET'])
+def catalog_snapshot_stats():
+    """Size and age of the mmapped catalog snapshot"""
+    return jsonify(catalog_snapshot.stats() if catalog_snapshot else {'enabled': False})
+
 
 
 
@@ -0,0 +1,87 @@
+"""Build fingerprinted, precompressed frontend assets.
+
+Usage: python build_assets.py
+
+Reads the sources in frontend/, writes content-hashed copies (plus .gz and,
+when the brotli module is installed, .br variants) to frontend/dist/ and
+rewrites the references in index.html. The server picks the build up through
+StaticAssetCache.
+"""
+import gzip
+import hashlib
+import json
+import os
+from typing import Dict
+
+try:
+    import brotli
+except ImportError:  # brotli is optional, gzip is always produced
+    brotli = None
+
+from config import Config
+
+# Assets referenced from index.html that get a content hash in their name
+FINGERPRINTED_ASSETS = ['css/style.css', 'js/script.js']
+
+MANIFEST_NAME = 'manifest.json'
+
+
+def content_hash(data: bytes, length: int = 12) -> str:
+    """Short hex digest used both in file names and as ETag"""
+    return hashlib.sha256(data).hexdigest()[:length]
+
+
+def fingerprint_name(path: str, digest: str) -> str:
+    """css/style.css -> css/style.<digest>.css"""
+    root, ext = os.path.splitext(path)
+    return f"{root}.{digest}{ext}"
+
+
+def _write(path: str, data: bytes):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(data)
+
+
+def _write_variants(dist_dir: str, rel_path: str, data: bytes):
+    """Write the raw file and its compressed variants"""
+    target = os.path.join(dist_dir, rel_path)
+    _write(target, data)
+    _write(target + '.gz', gzip.compress(data, compresslevel=9, mtime=0))
+    if brotli is not None:
+        _write(target + '.br', brotli.compress(data, quality=11))
+
+
+def build(frontend_dir: str, dist_dir: str) -> Dict:
+    """Build the dist directory and return the manifest"""
+    manifest = {'assets': {}, 'index': {}}
+
+    for rel_path in FINGERPRINTED_ASSETS:
+        with open(os.path.join(frontend_dir, rel_path), 'rb') as f:
+            data = f.read()
+        digest = content_hash(data)
+        hashed = fingerprint_name(rel_path, digest)
+        _write_variants(dist_dir, hashed, data)
+        manifest['assets'][rel_path] = {'path': hashed, 'etag': digest}
+
+    with open(os.path.join(frontend_dir, 'index.html'), 'r', encoding='utf-8') as f:
+        html = f.read()
+    for rel_path, entry in manifest['assets'].items():
+        html = html.replace(f'"{rel_path}"', f'"{entry["path"]}"')
+
+    index_data = html.encode('utf-8')
+    _write_variants(dist_dir, 'index.html', index_data)
+    manifest['index'] = {'path': 'index.html', 'etag': content_hash(index_data)}
+
+    with open(os.path.join(dist_dir, MANIFEST_NAME), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+
+    return manifest
+
+
+if __name__ == '__main__':
+    config = Config()
+    manifest = build(config.FRONTEND_DIR, config.STATIC_DIST_DIR)
+    for source, entry in manifest['assets'].items():
+        print(f"✅ {source} -> {entry['path']}")
+    print(f"✅ index.html rewritten ({'gzip + brotli' if brotli else 'gzip only'})")
@@ -0,0 +1,338 @@
+"""Bulk import of the ERP product export into the products table.
+
+Usage:
+    python catalog_import.py export.csv
+    python catalog_import.py export.jsonl --diff-out changes.jsonl --delete-missing
+
+The file is streamed through COPY into a temporary staging table and merged
+into products with a single upsert, so memory use does not depend on the
+size of the export.
+"""
+import argparse
+import csv
+import io
+import json
+import os
+import sys
+import time
+from typing import Dict, Iterator, List, Optional
+
+from psycopg2.extras import RealDictCursor
+
+from catalog_snapshot import export_snapshot
+from config import Config
+from db_manager import DatabaseManager
+from restock_matcher import match_restocks
+
+COLUMNS = ['internal_reference', 'product_name', 'quantity_on_hand', 'sales_price']
+
+STAGING_TABLE = 'products_staging'
+
+
+def _is_jsonl(path: str) -> bool:
+    return path.endswith('.jsonl') or path.endswith('.ndjson')
+
+
+def _column_name(name: str) -> str:
+    return (name or '').strip().lower()
+
+
+def read_records(path: str) -> Iterator[Dict]:
+    """Yield product records from a CSV or JSONL export"""
+    # utf-8-sig: ERP exports often start with a BOM, which would otherwise
+    # become part of the first column name
+    if _is_jsonl(path):
+        with open(path, 'r', encoding='utf-8-sig') as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    yield json.loads(line)
+    else:
+        with open(path, 'r', encoding='utf-8-sig', newline='') as f:
+            reader = csv.DictReader(f)
+            reader.fieldnames = [_column_name(name) for name in reader.fieldnames or []]
+            yield from reader
+
+
+def check_columns(path: str):
+    """Fail before touching the database when the export lacks a required column"""
+    if _is_jsonl(path):
+        first = next(read_records(path), None)
+        found = set(first) if isinstance(first, dict) else set()
+    else:
+        with open(path, 'r', encoding='utf-8-sig', newline='') as f:
+            found = {_column_name(name) for name in next(csv.reader(f), [])}
+    missing = [col for col in COLUMNS if col not in found]
+    if missing:
+        raise ValueError(f"{path}: missing column(s) {', '.join(missing)}; "
+                         f"found {', '.join(sorted(found)) or 'none'}")
+
+
+def _copy_value(value) -> str:
+    """Format a value for COPY text format"""
+    if value is None or value == '':
+        return '\\N'
+    return (str(value)
+            .replace('\\', '\\\\')
+            .replace('\t', '\\t')
+            .replace('\n', '\\n')
+            .replace('\r', '\\r'))
+
+
+class CopyStream(io.RawIOBase):
+    """File-like object that renders records as COPY rows on demand"""
+
+    def __init__(self, records: Iterator[Dict], progress_every: int = 50000):
+        self.records = records
+        self.buffer = b''
+        self.rows = 0
+        self.skipped = 0
+        self.started = time.monotonic()
+        self.progress_every = progress_every
+
+    def readable(self):
+        return True
+
+    def _next_line(self) -> Optional[bytes]:
+        for record in self.records:
+            reference = record.get('internal_reference')
+            reference = '' if reference is None else str(reference).strip()
+            if not reference:
+                self.skipped += 1
+                continue
+            values = [reference] + [record.get(col) for col in COLUMNS[1:]]
+            self.rows += 1
+            if self.rows % self.progress_every == 0:
+                print(f"   ... {self.rows} rows staged ({self.rate():.0f} rows/sec)")
+            return ('\t'.join(_copy_value(v) for v in values) + '\n').encode('utf-8')
+        return None
+
+    def read(self, size: int = -1) -> bytes:
+        while size < 0 or len(self.buffer) < size:
+            line = self._next_line()
+            if line is None:
+                break
+            self.buffer += line
+        if size < 0:
+            size = len(self.buffer)
+        chunk, self.buffer = self.buffer[:size], self.buffer[size:]
+        return chunk
+
+    def rate(self) -> float:
+        elapsed = time.monotonic() - self.started
+        return self.rows / elapsed if elapsed > 0 else 0.0
+
+
+class CatalogImporter:
+    """Stage an export with COPY and merge it into products"""
+
+    def __init__(self, db: DatabaseManager):
+        self.db = db
+
+    def ensure_indexes(self, cursor):
+        """Indexes the upsert and the chat searches rely on"""
+        # ON CONFLICT needs a unique index on internal_reference; reuse the
+        # primary key or unique constraint when the table already has one
+        cursor.execute("""
+            SELECT 1
+            FROM pg_index i
+            JOIN pg_attribute a ON a.attrelid = i.indrelid AND a.attnum = i.indkey[0]
+            WHERE i.indrelid = 'products'::regclass
+              AND i.indisunique AND i.indnatts = 1 AND i.indpred IS NULL
+              AND a.attname = 'internal_reference'
+        """)
+        if cursor.fetchone() is None:
+            cursor.execute("""
+                CREATE UNIQUE INDEX products_internal_reference_key
+                ON products (internal_reference)
+            """)
+        cursor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS products_product_name_trgm_idx
+            ON products USING gin (product_name gin_trgm_ops)
+        """)
+
+    def stage(self, cursor, records: Iterator[Dict]) -> CopyStream:
+        """COPY the records into a temporary staging table"""
+        cursor.execute(f"""
+            CREATE TEMP TABLE {STAGING_TABLE} (
+                internal_reference TEXT NOT NULL,
+                product_name TEXT,
+                quantity_on_hand NUMERIC,
+                sales_price NUMERIC
+            ) ON COMMIT DROP
+        """)
+        stream = CopyStream(records)
+        cursor.copy_expert(
+            f"COPY {STAGING_TABLE} ({', '.join(COLUMNS)}) FROM STDIN WITH (FORMAT text)",
+            stream,
+            size=65536
+        )
+        # Last row wins when the export repeats a reference
+        cursor.execute(f"""
+            DELETE FROM {STAGING_TABLE} a
+            USING (
+                SELECT internal_reference, max(ctid) AS keep
+                FROM {STAGING_TABLE}
+                GROUP BY internal_reference
+                HAVING count(*) > 1
+            ) d
+            WHERE a.internal_reference = d.internal_reference AND a.ctid <> d.keep
+        """)
+        cursor.execute(f"CREATE INDEX ON {STAGING_TABLE} (internal_reference)")
+        cursor.execute(f"ANALYZE {STAGING_TABLE}")
+        return stream
+
+    def write_diff(self, diff_path: str) -> int:
+        """Stream the rows that will change to a JSONL file"""
+        written = 0
+        with self.db.connection.cursor('catalog_diff', cursor_factory=RealDictCursor) as cursor, \
+                open(diff_path, 'w', encoding='utf-8') as out:
+            cursor.itersize = 10000
+            cursor.execute(f"""
+                SELECT s.internal_reference,
+                       CASE WHEN p.internal_reference IS NULL THEN 'insert' ELSE 'update' END AS change,
+                       p.product_name AS old_product_name, s.product_name AS new_product_name,
+                       p.quantity_on_hand AS old_quantity_on_hand, s.quantity_on_hand AS new_quantity_on_hand,
+                       p.sales_price AS old_sales_price, s.sales_price AS new_sales_price
+                FROM {STAGING_TABLE} s
+                LEFT JOIN products p ON p.internal_reference = s.internal_reference
+                WHERE p.internal_reference IS NULL
+                   OR (p.product_name, p.quantity_on_hand, p.sales_price)
+                      IS DISTINCT FROM (s.product_name, s.quantity_on_hand, s.sales_price)
+            """)
+            for row in cursor:
+                out.write(json.dumps(dict(row), default=str) + '\n')
+                written += 1
+        return written
+
+    def merge(self, cursor, delete_missing: bool = False) -> Dict:
+        """Upsert staged rows into products, touching only rows that changed"""
+        cursor.execute(f"""
+            WITH upserted AS (
+                INSERT INTO products ({', '.join(COLUMNS)})
+                SELECT {', '.join(COLUMNS)} FROM {STAGING_TABLE}
+                ON CONFLICT (internal_reference) DO UPDATE
+                SET product_name = EXCLUDED.product_name,
+                    quantity_on_hand = EXCLUDED.quantity_on_hand,
+                    sales_price = EXCLUDED.sales_price
+                WHERE (products.product_name, products.quantity_on_hand, products.sales_price)
+                      IS DISTINCT FROM
+                      (EXCLUDED.product_name, EXCLUDED.quantity_on_hand, EXCLUDED.sales_price)
+                RETURNING (xmax = 0) AS inserted
+            )
+            SELECT count(*) FILTER (WHERE inserted) AS inserted,
+                   count(*) FILTER (WHERE NOT inserted) AS updated
+            FROM upserted
+        """)
+        inserted, updated = cursor.fetchone()
+        deleted = 0
+        if delete_missing:
+            cursor.execute(f"""
+                DELETE FROM products p
+                WHERE NOT EXISTS (
+                    SELECT 1 FROM {STAGING_TABLE} s WHERE s.internal_reference = p.internal_reference
+                )
+            """)
+            deleted = cursor.rowcount
+        return {'inserted': inserted, 'updated': updated, 'deleted': deleted}
+
+    def check_staged(self, stream: CopyStream):
+        """Refuse to merge an export that was mostly unreadable.
+
+        With delete_missing, merging an empty staging table would wipe the
+        whole catalog, so a bad export must stop here.
+        """
+        if stream.rows == 0:
+            raise ValueError(f"No rows staged ({stream.skipped} skipped), refusing to merge")
+        if stream.skipped > stream.rows:
+            raise ValueError(f"{stream.skipped} rows skipped but only {stream.rows} staged, "
+                             f"refusing to merge")
+
+    def run(self, path: str, diff_path: str = None, delete_missing: bool = False) -> Dict:
+        """Import one export file in a single transaction"""
+        check_columns(path)
+        self.db.ensure_connection()
+        started = time.monotonic()
+        try:
+            with self.db.connection.cursor() as cursor:
+                self.ensure_indexes(cursor)
+                stream = self.stage(cursor, read_records(path))
+            self.check_staged(stream)
+            copy_seconds = time.monotonic() - started
+
+            changes = self.write_diff(diff_path) if diff_path else None
+
+            with self.db.connection.cursor() as cursor:
+                summary = self.merge(cursor, delete_missing)
+            self.db.connection.commit()
+
+            # Refresh planner statistics once the bulk change is visible
+            with self.db.connection.cursor() as cursor:
+                cursor.execute("ANALYZE products")
+            self.db.connection.commit()
+        except Exception:
+            self.db.connection.rollback()
+            raise
+
+        total_seconds = time.monotonic() - started
+        summary.update({
+            'rows': stream.rows,
+            'skipped': stream.skipped,
+            'unchanged': stream.rows - summary['inserted'] - summary['updated'],
+            'diff_rows': changes,
+            'copy_rows_per_sec': round(stream.rows / copy_seconds) if copy_seconds > 0 else None,
+            'rows_per_sec': round(stream.rows / total_seconds) if total_seconds > 0 else None,
+            'seconds': round(total_seconds, 2),
+        })
+        return summary
+
+
+def main(argv: List[str] = None):
+    parser = argparse.ArgumentParser(description='Import the ERP product export into products')
+    parser.add_argument('path', help='CSV or JSONL export')
+    parser.add_argument('--diff-out', help='write changed rows (old/new values) to this JSONL file')
+    parser.add_argument('--delete-missing', action='store_true',
+                        help='delete products that are not in the export')
+    parser.add_argument('--skip-restock-match', action='store_true',
+                        help='do not notify contact requests for restocked products')
+    parser.add_argument('--skip-snapshot', action='store_true',
+                        help='do not rewrite the catalog snapshot after importing')
+    args = parser.parse_args(argv)
+
+    if not os.path.isfile(args.path):
+        print(f"❌ File not found: {args.path}")
+        sys.exit(1)
+
+    db = DatabaseManager()
+    try:
+        try:
+            summary = CatalogImporter(db).run(args.path, args.diff_out, args.delete_missing)
+        except ValueError as e:
+            print(f"❌ Import aborted: {e}")
+            sys.exit(1)
+        print(f"✅ Imported {summary['rows']} rows in {summary['seconds']}s "
+              f"({summary['rows_per_sec']} rows/sec, COPY {summary['copy_rows_per_sec']} rows/sec)")
+        print(f"   inserted={summary['inserted']} updated={summary['updated']} "
+              f"unchanged={summary['unchanged']} deleted={summary['deleted']} skipped={summary['skipped']}")
+
+        if not args.skip_restock_match:
+            try:
+                restock = match_restocks(db.connection)
+                print(f"✅ {restock['restocked']} restocked products, "
+                      f"{restock['queued']} notifications queued")
+            except Exception as e:
+                print(f"⚠️ Restock matching failed (run restock_matcher.py --install?): {e}")
+
+        if not args.skip_snapshot:
+            try:
+                count = export_snapshot(db.connection, Config.CATALOG_SNAPSHOT_PATH)
+                print(f"✅ Catalog snapshot rewritten ({count} products)")
+            except Exception as e:
+                print(f"⚠️ Catalog snapshot export failed: {e}")
+    finally:
+        db.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,258 @@
+"""Read-only binary snapshot of the products table, shared between workers.
+
+Usage:
+    python catalog_snapshot.py --export             # write CATALOG_SNAPSHOT_PATH
+    python catalog_snapshot.py --lookup REF [REF ...]
+
+Layout (little endian, sections 8-byte aligned):
+    header   magic, version, counts, section offsets, export time
+    records  fixed-width rows: string pool offsets/lengths, quantity, price
+    index    uint32 record numbers sorted by internal_reference (UTF-8 bytes)
+    pool     UTF-8 references and product names, back to back
+
+Workers mmap the file read-only, so every process on the host shares the
+same page-cache copy and opening it costs nothing regardless of catalog
+size. Lookups binary-search the index directly in the mapping. The exporter
+replaces the file atomically; readers notice the new inode and remap.
+"""
+import argparse
+import mmap
+import os
+import struct
+import threading
+import time
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+MAGIC = b'CATSNAP\x00'
+VERSION = 1
+HEADER = struct.Struct('<8sIIQQQQQd')
+RECORD_DTYPE = np.dtype([
+    ('ref_offset', '<u8'),
+    ('name_offset', '<u8'),
+    ('ref_len', '<u4'),
+    ('name_len', '<u4'),
+    ('quantity', '<f8'),
+    ('price', '<f8'),
+])
+INDEX_DTYPE = np.dtype('<u4')
+
+
+def _align(offset: int) -> int:
+    return (offset + 7) & ~7
+
+
+def _number(value) -> float:
+    return float('nan') if value is None else float(value)
+
+
+def write_snapshot(rows: Iterable, path: str) -> int:
+    """Write (internal_reference, product_name, quantity_on_hand, sales_price) rows"""
+    pool = bytearray()
+    records = []
+    keys = []
+    for ref, name, quantity, price in rows:
+        if ref is None:
+            continue
+        ref_bytes = str(ref).encode('utf-8')
+        name_bytes = (name or '').encode('utf-8')
+        records.append((len(pool), len(pool) + len(ref_bytes), len(ref_bytes), len(name_bytes),
+                        _number(quantity), _number(price)))
+        keys.append(ref_bytes)
+        pool += ref_bytes
+        pool += name_bytes
+
+    record_array = np.array(records, dtype=RECORD_DTYPE)
+    index = np.array(sorted(range(len(keys)), key=keys.__getitem__), dtype=INDEX_DTYPE)
+
+    records_offset = _align(HEADER.size)
+    index_offset = _align(records_offset + record_array.nbytes)
+    pool_offset = _align(index_offset + index.nbytes)
+    header = HEADER.pack(MAGIC, VERSION, RECORD_DTYPE.itemsize, len(records),
+                         records_offset, index_offset, pool_offset, len(pool), time.time())
+
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as out:
+        for offset, chunk in ((0, header), (records_offset, record_array.tobytes()),
+                              (index_offset, index.tobytes()), (pool_offset, bytes(pool))):
+            out.write(b'\x00' * (offset - out.tell()))
+            out.write(chunk)
+        out.flush()
+        os.fsync(out.fileno())
+    os.replace(tmp_path, path)
+    return len(records)
+
+
+def export_snapshot(connection, path: str, batch_size: int = 10000) -> int:
+    """Stream the products table into a new snapshot file"""
+    def rows():
+        with connection.cursor('catalog_snapshot_export') as cursor:
+            cursor.itersize = batch_size
+            cursor.execute("""
+                SELECT internal_reference, product_name, quantity_on_hand, sales_price
+                FROM products
+            """)
+            yield from cursor
+
+    try:
+        return write_snapshot(rows(), path)
+    finally:
+        connection.rollback()
+
+
+class _Mapping:
+    """One opened snapshot file; kept alive while any reader still holds it"""
+
+    def __init__(self, path: str):
+        with open(path, 'rb') as f:
+            stat = os.fstat(f.fileno())
+            self.buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.identity = (stat.st_dev, stat.st_ino, stat.st_mtime_ns)
+
+        (magic, version, record_size, count, records_offset, index_offset,
+         pool_offset, pool_size, self.exported_at) = HEADER.unpack_from(self.buffer, 0)
+        if magic != MAGIC or version != VERSION or record_size != RECORD_DTYPE.itemsize:
+            raise ValueError(f"{path} is not a version {VERSION} catalog snapshot")
+        if pool_offset + pool_size > len(self.buffer):
+            raise ValueError(f"{path} is truncated")
+
+        self.count = count
+        self.records = np.frombuffer(self.buffer, RECORD_DTYPE, count, records_offset)
+        self.index = np.frombuffer(self.buffer, INDEX_DTYPE, count, index_offset)
+        self.pool_offset = pool_offset
+        # Column views into the mapping, no copy
+        self.ref_offsets = self.records['ref_offset']
+        self.ref_lens = self.records['ref_len']
+
+    def _ref(self, row: int) -> bytes:
+        start = self.pool_offset + int(self.ref_offsets[row])
+        return self.buffer[start:start + int(self.ref_lens[row])]
+
+    def find(self, key: bytes) -> Optional[int]:
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._ref(int(self.index[mid])) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < self.count:
+            row = int(self.index[lo])
+            if self._ref(row) == key:
+                return row
+        return None
+
+    def product(self, row: int) -> Dict:
+        record = self.records[row]
+        start = self.pool_offset + int(record['name_offset'])
+        quantity = float(record['quantity'])
+        price = float(record['price'])
+        if quantity == quantity and quantity.is_integer():
+            quantity = int(quantity)
+        return {
+            'internal_reference': self._ref(row).decode('utf-8'),
+            'product_name': self.buffer[start:start + int(record['name_len'])].decode('utf-8'),
+            'quantity_on_hand': None if quantity != quantity else quantity,
+            'sales_price': None if price != price else price,
+        }
+
+
+class CatalogSnapshot:
+    """Exact internal_reference lookups against the mmapped snapshot file"""
+
+    def __init__(self, path: str, check_interval: float = 5.0):
+        self.path = path
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._mapping = _Mapping(path)
+        self._last_check = time.monotonic()
+
+    def __len__(self):
+        return self._mapping.count
+
+    @property
+    def exported_at(self) -> float:
+        return self._mapping.exported_at
+
+    def _current(self) -> _Mapping:
+        mapping = self._mapping
+        if time.monotonic() - self._last_check < self.check_interval:
+            return mapping
+        with self._lock:
+            self._last_check = time.monotonic()
+            try:
+                stat = os.stat(self.path)
+                if (stat.st_dev, stat.st_ino, stat.st_mtime_ns) != self._mapping.identity:
+                    # The old mapping is released once in-flight lookups drop it
+                    self._mapping = _Mapping(self.path)
+                    print(f"✅ Catalog snapshot reloaded ({self._mapping.count} products)")
+            except (OSError, ValueError) as e:
+                print(f"⚠️ Could not reload catalog snapshot, keeping the current one: {e}")
+            return self._mapping
+
+    def get(self, reference: str) -> Optional[Dict]:
+        mapping = self._current()
+        row = mapping.find(reference.encode('utf-8'))
+        return mapping.product(row) if row is not None else None
+
+    def get_many(self, references: List[str]) -> Dict[str, Optional[Dict]]:
+        mapping = self._current()
+        found = {}
+        for reference in references:
+            row = mapping.find(reference.encode('utf-8'))
+            found[reference] = mapping.product(row) if row is not None else None
+        return found
+
+    def stats(self) -> Dict:
+        mapping = self._current()
+        return {
+            'path': self.path,
+            'products': mapping.count,
+            'exported_at': mapping.exported_at,
+            'age_seconds': round(time.time() - mapping.exported_at, 1),
+        }
+
+
+def open_snapshot(path: str) -> Optional[CatalogSnapshot]:
+    """Open the snapshot if one has been exported, else None"""
+    if not path or not os.path.isfile(path):
+        return None
+    try:
+        snapshot = CatalogSnapshot(path)
+        print(f"✅ Catalog snapshot mapped ({len(snapshot)} products)")
+        return snapshot
+    except (OSError, ValueError) as e:
+        print(f"⚠️ Could not open catalog snapshot: {e}")
+        return None
+
+
+def main(argv: List[str] = None):
+    from config import Config
+    from db_manager import DatabaseManager
+
+    parser = argparse.ArgumentParser(description='Export or inspect the catalog snapshot')
+    parser.add_argument('--out', default=Config.CATALOG_SNAPSHOT_PATH, help='snapshot file')
+    parser.add_argument('--export', action='store_true', help='write the snapshot from products')
+    parser.add_argument('--lookup', nargs='+', metavar='REF', help='look references up in the snapshot')
+    args = parser.parse_args(argv)
+    if not args.export and not args.lookup:
+        parser.error('nothing to do, pass --export and/or --lookup')
+
+    if args.export:
+        db = DatabaseManager()
+        try:
+            started = time.perf_counter()
+            count = export_snapshot(db.connection, args.out)
+            print(f"✅ {count} products written to {args.out} in {time.perf_counter() - started:.1f}s")
+        finally:
+            db.close()
+    if args.lookup:
+        snapshot = CatalogSnapshot(args.out)
+        for reference, product in snapshot.get_many(args.lookup).items():
+            print(f"{reference}: {product}")
+
+
+if __name__ == '__main__':
+    main()
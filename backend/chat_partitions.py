@@ -0,0 +1,324 @@
+"""Storage lifecycle for chat history: monthly partitions, retention, archival.
+
+Usage:
+    python chat_partitions.py --migrate [--drop-legacy]   # one-off conversion
+    python chat_partitions.py --maintain                  # run daily (cron)
+
+chat_messages is range-partitioned by month on its timestamp column. The
+maintenance run creates partitions ahead of time, and detaches partitions
+older than the retention window. Each detached partition is archived as a
+gzipped CSV in CHAT_ARCHIVE_DIR and then dropped, which avoids the bloat of
+large DELETEs. chat_sessions stays a plain table, because save_chat_session
+upserts on session_id alone and a partitioned table cannot enforce that
+uniqueness. Sessions left without any messages are deleted in batches
+instead, once they are a day old (created_at is added by --migrate), so a
+session saved just before its first message is kept.
+
+--migrate moves the table's indexes, foreign keys and triggers over to the
+partitioned table, but installs nothing else: run demand_rollup.py --install
+separately if the demand triggers are not installed yet.
+"""
+import argparse
+import gzip
+import os
+import re
+from datetime import date
+from typing import List
+
+from psycopg2 import sql
+
+from config import Config
+from db_manager import DatabaseManager
+
+PARENT_TABLE = 'chat_messages'
+LEGACY_TABLE = 'chat_messages_legacy'
+PARTITION_RE = re.compile(r'^chat_messages_p(\d{4})(\d{2})$')
+# Matches the table in pg_get_indexdef/pg_get_triggerdef output
+LEGACY_ON_RE = re.compile(r' ON (?:\S+\.)?"?' + LEGACY_TABLE + r'"? ')
+ORPHAN_SESSION_MIN_AGE = '1 day'
+
+
+def _month_start(day: date, offset: int = 0) -> date:
+    month = day.year * 12 + (day.month - 1) + offset
+    return date(month // 12, month % 12 + 1, 1)
+
+
+def partition_name(month: date) -> str:
+    return f"{PARENT_TABLE}_p{month.year:04d}{month.month:02d}"
+
+
+def is_partitioned(cursor) -> bool:
+    cursor.execute("""
+        SELECT c.relkind = 'p'
+        FROM pg_class c
+        WHERE c.oid = to_regclass(%s)
+    """, (PARENT_TABLE,))
+    row = cursor.fetchone()
+    return bool(row and row[0])
+
+
+def create_partition(cursor, month: date):
+    """Create the partition for `month` if it does not exist yet"""
+    cursor.execute(sql.SQL("""
+        CREATE TABLE IF NOT EXISTS {partition} PARTITION OF {parent}
+        FOR VALUES FROM (%s) TO (%s)
+    """).format(partition=sql.Identifier(partition_name(month)), parent=sql.Identifier(PARENT_TABLE)),
+        (month, _month_start(month, 1)))
+
+
+def ensure_future_partitions(connection, months_ahead: int) -> List[str]:
+    """Make sure partitions exist from this month up to `months_ahead` months out"""
+    created = []
+    try:
+        with connection.cursor() as cursor:
+            if not is_partitioned(cursor):
+                return created
+            this_month = _month_start(date.today())
+            for offset in range(months_ahead + 1):
+                month = _month_start(this_month, offset)
+                cursor.execute("SELECT to_regclass(%s)", (partition_name(month),))
+                if cursor.fetchone()[0] is None:
+                    create_partition(cursor, month)
+                    created.append(partition_name(month))
+        connection.commit()
+    except Exception:
+        connection.rollback()
+        raise
+    return created
+
+
+def _copy_legacy_definitions(cursor):
+    """Recreate the legacy table's secondary indexes, foreign keys and triggers.
+
+    LIKE copies neither, so without this history lookups by session_id lose
+    their index after the swap. Unique indexes that do not include the
+    partition key cannot exist on a partitioned table and are skipped.
+    """
+    cursor.execute("""
+        SELECT pg_get_indexdef(i.indexrelid), i.indisunique,
+               'timestamp' = ANY(array_agg(a.attname))
+        FROM pg_index i
+        LEFT JOIN pg_attribute a ON a.attrelid = i.indrelid AND a.attnum = ANY(i.indkey)
+        WHERE i.indrelid = %s::regclass AND NOT i.indisprimary
+        GROUP BY i.indexrelid, i.indisunique
+    """, (LEGACY_TABLE,))
+    for definition, unique, has_partition_key in cursor.fetchall():
+        if unique and not has_partition_key:
+            print(f"⚠️ Skipping unique index without the partition key: {definition}")
+            continue
+        # Let Postgres pick a name, the legacy index keeps its own
+        definition = re.sub(r'^(CREATE (?:UNIQUE )?INDEX) \S+', r'\1', definition)
+        cursor.execute(LEGACY_ON_RE.sub(f' ON {PARENT_TABLE} ', definition, count=1))
+
+    cursor.execute("""
+        SELECT conname, pg_get_constraintdef(oid)
+        FROM pg_constraint
+        WHERE conrelid = %s::regclass AND contype = 'f'
+    """, (LEGACY_TABLE,))
+    for name, definition in cursor.fetchall():
+        cursor.execute(sql.SQL("ALTER TABLE {} ADD CONSTRAINT {} ").format(
+            sql.Identifier(PARENT_TABLE), sql.Identifier(name)).as_string(cursor) + definition)
+
+    cursor.execute("""
+        SELECT pg_get_triggerdef(oid)
+        FROM pg_trigger
+        WHERE tgrelid = %s::regclass AND NOT tgisinternal
+    """, (LEGACY_TABLE,))
+    for (definition,) in cursor.fetchall():
+        cursor.execute(LEGACY_ON_RE.sub(f' ON {PARENT_TABLE} ', definition, count=1))
+
+
+def migrate(connection, months_ahead: int, drop_legacy: bool = False) -> int:
+    """Convert chat_messages into a monthly range-partitioned table"""
+    try:
+        with connection.cursor() as cursor:
+            if is_partitioned(cursor):
+                print("ℹ️ chat_messages is already partitioned")
+                return 0
+
+            cursor.execute(f"ALTER TABLE {PARENT_TABLE} RENAME TO {LEGACY_TABLE}")
+            cursor.execute(f"""
+                CREATE TABLE {PARENT_TABLE}
+                (LIKE {LEGACY_TABLE} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)
+                PARTITION BY RANGE (timestamp)
+            """)
+
+            # Unique keys on a partitioned table must include the partition key
+            cursor.execute("""
+                SELECT a.attname
+                FROM pg_index i
+                JOIN pg_attribute a ON a.attrelid = i.indrelid AND a.attnum = ANY(i.indkey)
+                WHERE i.indrelid = %s::regclass AND i.indisprimary
+            """, (LEGACY_TABLE,))
+            key_columns = [row[0] for row in cursor.fetchall()]
+            if key_columns:
+                if 'timestamp' not in key_columns:
+                    key_columns.append('timestamp')
+                cursor.execute(sql.SQL("ALTER TABLE {} ADD PRIMARY KEY ({})").format(
+                    sql.Identifier(PARENT_TABLE), sql.SQL(', ').join(map(sql.Identifier, key_columns))))
+            _copy_legacy_definitions(cursor)
+            cursor.execute(f"""
+                CREATE INDEX IF NOT EXISTS chat_messages_session_timestamp_idx
+                ON {PARENT_TABLE} (session_id, timestamp DESC)
+            """)
+            # Lets purge_orphan_sessions spare sessions still waiting for a message
+            cursor.execute("""
+                ALTER TABLE chat_sessions
+                ADD COLUMN IF NOT EXISTS created_at TIMESTAMPTZ NOT NULL DEFAULT now()
+            """)
+
+            # Keep serial sequences alive if the legacy table is dropped later
+            cursor.execute("""
+                SELECT attname, pg_get_serial_sequence(%s, attname)
+                FROM pg_attribute
+                WHERE attrelid = %s::regclass AND attnum > 0 AND NOT attisdropped
+            """, (LEGACY_TABLE, LEGACY_TABLE))
+            for column, sequence in cursor.fetchall():
+                if sequence:
+                    cursor.execute(sql.SQL("ALTER SEQUENCE {} OWNED BY {}.{}").format(
+                        sql.SQL(sequence), sql.Identifier(PARENT_TABLE), sql.Identifier(column)))
+
+            cursor.execute(f"SELECT min(timestamp), max(timestamp) FROM {LEGACY_TABLE}")
+            oldest, newest = cursor.fetchone()
+            today = date.today()
+            first = _month_start(oldest.date() if oldest else today)
+            last = _month_start(max(newest.date() if newest else today, today), months_ahead)
+            month = first
+            while month <= last:
+                create_partition(cursor, month)
+                month = _month_start(month, 1)
+            cursor.execute(f"CREATE TABLE IF NOT EXISTS {PARENT_TABLE}_default PARTITION OF {PARENT_TABLE} DEFAULT")
+
+            cursor.execute(f"INSERT INTO {PARENT_TABLE} SELECT * FROM {LEGACY_TABLE}")
+            moved = cursor.rowcount
+            if drop_legacy:
+                cursor.execute(f"DROP TABLE {LEGACY_TABLE}")
+        connection.commit()
+    except Exception:
+        connection.rollback()
+        raise
+    return moved
+
+
+def archive_partition(connection, table: str, archive_dir: str) -> str:
+    """Write a detached partition to a gzipped CSV file"""
+    os.makedirs(archive_dir, exist_ok=True)
+    path = os.path.join(archive_dir, f"{table}.csv.gz")
+    tmp_path = path + '.tmp'
+    with connection.cursor() as cursor, gzip.open(tmp_path, 'wb') as out:
+        cursor.copy_expert(
+            sql.SQL("COPY {} TO STDOUT WITH (FORMAT csv, HEADER)").format(sql.Identifier(table)).as_string(cursor),
+            out
+        )
+    os.replace(tmp_path, path)
+    return path
+
+
+def apply_retention(connection, retention_months: int, archive_dir: str) -> List[str]:
+    """Detach, archive and drop partitions that fall entirely before the retention window.
+
+    Month tables left detached by an earlier run whose archive or DROP failed
+    are picked up again here, not just the ones still attached.
+    """
+    cutoff = _month_start(date.today(), -retention_months)
+    archived = []
+    with connection.cursor() as cursor:
+        cursor.execute("""
+            SELECT c.relname
+            FROM pg_inherits i
+            JOIN pg_class c ON c.oid = i.inhrelid
+            WHERE i.inhparent = %s::regclass
+        """, (PARENT_TABLE,))
+        attached = {row[0] for row in cursor.fetchall()}
+        cursor.execute("""
+            SELECT tablename FROM pg_tables
+            WHERE schemaname = current_schema() AND tablename LIKE 'chat_messages_p%'
+        """)
+        partitions = sorted(attached | {row[0] for row in cursor.fetchall()})
+    connection.commit()
+
+    for table in partitions:
+        match = PARTITION_RE.match(table)
+        if not match or date(int(match.group(1)), int(match.group(2)), 1) >= cutoff:
+            continue
+        try:
+            if table in attached:
+                with connection.cursor() as cursor:
+                    cursor.execute(sql.SQL("ALTER TABLE {} DETACH PARTITION {}").format(
+                        sql.Identifier(PARENT_TABLE), sql.Identifier(table)))
+                connection.commit()
+            path = archive_partition(connection, table, archive_dir)
+            with connection.cursor() as cursor:
+                cursor.execute(sql.SQL("DROP TABLE {}").format(sql.Identifier(table)))
+            connection.commit()
+            archived.append(path)
+            print(f"📦 {table} archived to {path}")
+        except Exception as e:
+            connection.rollback()
+            print(f"❌ Could not archive {table}, will retry on the next run: {e}")
+    return archived
+
+
+def purge_orphan_sessions(connection, batch_size: int = 10000) -> int:
+    """Delete chat_sessions, at least a day old, that no longer have any messages"""
+    with connection.cursor() as cursor:
+        cursor.execute("""
+            SELECT 1 FROM information_schema.columns
+            WHERE table_schema = current_schema() AND table_name = 'chat_sessions'
+              AND column_name = 'created_at'
+        """)
+        has_created_at = cursor.fetchone() is not None
+    connection.commit()
+    if not has_created_at:
+        print("⚠️ chat_sessions has no created_at column (run --migrate), not purging sessions")
+        return 0
+
+    deleted = 0
+    while True:
+        with connection.cursor() as cursor:
+            cursor.execute("""
+                DELETE FROM chat_sessions
+                WHERE ctid IN (
+                    SELECT s.ctid FROM chat_sessions s
+                    WHERE s.created_at < now() - %s::interval
+                      AND NOT EXISTS (
+                        SELECT 1 FROM chat_messages m WHERE m.session_id = s.session_id
+                      )
+                    LIMIT %s
+                )
+            """, (ORPHAN_SESSION_MIN_AGE, batch_size))
+            count = cursor.rowcount
+        connection.commit()
+        deleted += count
+        if count < batch_size:
+            return deleted
+
+
+def main(argv: List[str] = None):
+    config = Config()
+    parser = argparse.ArgumentParser(description='Partition, retain and archive chat history')
+    parser.add_argument('--migrate', action='store_true', help='convert chat_messages to monthly partitions')
+    parser.add_argument('--drop-legacy', action='store_true', help='drop the unpartitioned table after migrating')
+    parser.add_argument('--maintain', action='store_true', help='create future partitions and apply retention')
+    args = parser.parse_args(argv)
+    if not args.migrate and not args.maintain:
+        parser.error('nothing to do, pass --migrate and/or --maintain')
+
+    db = DatabaseManager()
+    try:
+        if args.migrate:
+            moved = migrate(db.connection, config.CHAT_PARTITION_MONTHS_AHEAD, args.drop_legacy)
+            print(f"✅ chat_messages partitioned ({moved} rows moved)")
+        if args.maintain:
+            created = ensure_future_partitions(db.connection, config.CHAT_PARTITION_MONTHS_AHEAD)
+            print(f"✅ {len(created)} partitions created")
+            archived = apply_retention(db.connection, config.CHAT_RETENTION_MONTHS, config.CHAT_ARCHIVE_DIR)
+            print(f"✅ {len(archived)} partitions archived")
+            purged = purge_orphan_sessions(db.connection)
+            print(f"✅ {purged} orphan sessions deleted")
+    finally:
+        db.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -9,14 +9,78 @@ class Config:
     DB_NAME = os.getenv('DB_NAME', 'product_db')
     DB_USER = os.getenv('DB_USER', 'postgres')
     DB_PASSWORD = os.getenv('DB_PASSWORD', 'nawel')
+    DB_CONNECT_TIMEOUT = int(os.getenv('DB_CONNECT_TIMEOUT', '5'))
     
     # DeepSeek API
     DEEPSEEK_API_KEY = os.getenv('DEEPSEEK_API_KEY', 'hna thot api')
     DEEPSEEK_BASE_URL = 'https://api.deepseek.com/v1'
     
+    # LLM routing: request parameters per conversation state. The structured
+    # extraction states answer with a few dozen JSON tokens, so they get tight
+    # budgets and deterministic sampling. LLM_ROUTES_JSON overrides single
+    # fields per state, e.g. {"welcome": {"max_tokens": 200}}.
+    LLM_DEFAULT_ROUTE = {'model': 'deepseek-chat', 'max_tokens': 500, 'temperature': 0.3, 'timeout': 20.0}
+    LLM_STATE_ROUTES = {
+        'welcome': {'max_tokens': 150},
+        'search_method_selection': {'max_tokens': 80, 'temperature': 0.0},
+        'collect_vehicle_info': {'max_tokens': 120, 'temperature': 0.0},
+        'confirm_vehicle': {'max_tokens': 80, 'temperature': 0.0},
+        'collect_part_name': {'max_tokens': 80, 'temperature': 0.0},
+        'collect_serial': {'max_tokens': 80, 'temperature': 0.0},
+        'collect_contact': {'max_tokens': 120, 'temperature': 0.0},
+    }
+    LLM_ROUTES_JSON = os.getenv('LLM_ROUTES_JSON', '{}')
+    
     # Flask
     FLASK_PORT = int(os.getenv('FLASK_PORT', '5000'))
     DEBUG = os.getenv('DEBUG', 'True').lower() == 'true'
+
+    # Static assets
+    FRONTEND_DIR = os.getenv('FRONTEND_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'frontend'))
+    STATIC_DIST_DIR = os.getenv('STATIC_DIST_DIR', os.path.join(FRONTEND_DIR, 'dist'))
+    STATIC_MAX_AGE = int(os.getenv('STATIC_MAX_AGE', '31536000'))
+
+    # Admission control
+    RATE_LIMIT_SESSION_PER_SEC = float(os.getenv('RATE_LIMIT_SESSION_PER_SEC', '0.5'))
+    RATE_LIMIT_SESSION_BURST = float(os.getenv('RATE_LIMIT_SESSION_BURST', '5'))
+    RATE_LIMIT_IP_PER_SEC = float(os.getenv('RATE_LIMIT_IP_PER_SEC', '2'))
+    RATE_LIMIT_IP_BURST = float(os.getenv('RATE_LIMIT_IP_BURST', '20'))
+    LLM_MAX_INFLIGHT = int(os.getenv('LLM_MAX_INFLIGHT', '8'))
+    LLM_MAX_QUEUE = int(os.getenv('LLM_MAX_QUEUE', '16'))
+    LLM_QUEUE_TIMEOUT = float(os.getenv('LLM_QUEUE_TIMEOUT', '2.0'))
+
+    # Search result cache
+    SEARCH_CACHE_ENABLED = os.getenv('SEARCH_CACHE_ENABLED', 'True').lower() == 'true'
+    SEARCH_CACHE_MAX_ENTRIES = int(os.getenv('SEARCH_CACHE_MAX_ENTRIES', '5000'))
+    SEARCH_CACHE_TTL = float(os.getenv('SEARCH_CACHE_TTL', '300'))
+
+    # Local intent classifier
+    INTENT_MODEL_PATH = os.getenv('INTENT_MODEL_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'models', 'intent_classifier.npz'))
+    INTENT_CONFIDENCE_THRESHOLD = float(os.getenv('INTENT_CONFIDENCE_THRESHOLD', '0.9'))
+
+    # Semantic product search
+    SEMANTIC_SEARCH_ENABLED = os.getenv('SEMANTIC_SEARCH_ENABLED', 'True').lower() == 'true'
+    SEMANTIC_SEARCH_NPROBE = int(os.getenv('SEMANTIC_SEARCH_NPROBE', '8'))
+    SEMANTIC_SEARCH_MIN_SCORE = float(os.getenv('SEMANTIC_SEARCH_MIN_SCORE', '0.45'))
+
+    # Bulk part lookup
+    BULK_LOOKUP_MAX_REFERENCES = int(os.getenv('BULK_LOOKUP_MAX_REFERENCES', '200'))
+
+    # Typeahead suggestions
+    # Rebuilt after product changes, at most once per SUGGEST_REFRESH_SECONDS;
+    # without changes only every SUGGEST_MAX_AGE_SECONDS for search statistics
+    SUGGEST_REFRESH_SECONDS = float(os.getenv('SUGGEST_REFRESH_SECONDS', '300'))
+    SUGGEST_MAX_AGE_SECONDS = float(os.getenv('SUGGEST_MAX_AGE_SECONDS', '3600'))
+    SUGGEST_HISTORY_DAYS = int(os.getenv('SUGGEST_HISTORY_DAYS', '90'))
+    SUGGEST_MIN_HITS = int(os.getenv('SUGGEST_MIN_HITS', '3'))
+
+    # Chat history partitions
+    CHAT_PARTITION_MONTHS_AHEAD = int(os.getenv('CHAT_PARTITION_MONTHS_AHEAD', '3'))
+    CHAT_RETENTION_MONTHS = int(os.getenv('CHAT_RETENTION_MONTHS', '12'))
+    CHAT_ARCHIVE_DIR = os.getenv('CHAT_ARCHIVE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'archive'))
+
+    # Catalog snapshot (mmapped, serves serial lookups while Postgres is down)
+    CATALOG_SNAPSHOT_PATH = os.getenv('CATALOG_SNAPSHOT_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'catalog.snap'))
     
     @property
     def DATABASE_URL(self):
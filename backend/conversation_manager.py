@@ -27,6 +27,10 @@ class SessionContext:
     search_results: List[Dict] = field(default_factory=list)
     awaiting_contact: bool = False
     requested_part: Optional[str] = None
+    last_ai_response: Optional[Dict] = None  # parsed intent of the current turn
+    last_ai_raw: Optional[str] = None  # raw model output, None when the fallback was used
+    last_demand: Optional[Dict] = None  # unmet demand signal of the current turn
+    last_search_hit: Optional[Dict] = None  # part search of the current turn that found stock
     
 class ConversationManager:
     def __init__(self):
@@ -92,6 +96,22 @@ class ConversationManager:
             'name': None  # Could be enhanced with name extraction
         }
     
+    def extract_part_references(self, text: str, limit: int = 200) -> List[str]:
+        """Extract part references from a pasted list (one per line, or comma/space separated)"""
+        # A reference has at least one digit and is 4+ characters of letters, digits, - . /
+        candidates = re.findall(r'[A-Za-z0-9][A-Za-z0-9\-./]{2,}[A-Za-z0-9]', text)
+        references = []
+        seen = set()
+        for candidate in candidates:
+            if not any(ch.isdigit() for ch in candidate):
+                continue
+            if candidate not in seen:
+                seen.add(candidate)
+                references.append(candidate)
+            if len(references) >= limit:
+                break
+        return references
+    
     def format_vehicle_string(self, session: SessionContext) -> str:
         """Format vehicle information as string"""
         parts = []
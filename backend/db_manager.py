@@ -1,26 +1,41 @@
+import time
 import psycopg2
 from psycopg2.extras import RealDictCursor
 import json
 from datetime import datetime
 from typing import List, Dict, Optional
 from config import Config
+from search_cache import SearchCache, MISS
+from product_vectors import ProductVectorIndex
+from catalog_snapshot import CatalogSnapshot
 
 class DatabaseManager:
-    def __init__(self):
+    def __init__(self, search_cache: SearchCache = None, vector_index: ProductVectorIndex = None,
+                 snapshot: CatalogSnapshot = None):
         self.config = Config()
         self.connection = None
+        self.search_cache = search_cache
+        self.vector_index = vector_index
+        self.snapshot = snapshot
+        self._ping_result = None
+        self._ping_at = 0.0
         self.connect()
     
+    def new_connection(self):
+        """Open a separate connection, for work that must not share the request one"""
+        return psycopg2.connect(
+            host=self.config.DB_HOST,
+            port=self.config.DB_PORT,
+            database=self.config.DB_NAME,
+            user=self.config.DB_USER,
+            password=self.config.DB_PASSWORD,
+            connect_timeout=self.config.DB_CONNECT_TIMEOUT
+        )
+    
     def connect(self):
         """Establish database connection"""
         try:
-            self.connection = psycopg2.connect(
-                host=self.config.DB_HOST,
-                port=self.config.DB_PORT,
-                database=self.config.DB_NAME,
-                user=self.config.DB_USER,
-                password=self.config.DB_PASSWORD
-            )
+            self.connection = self.new_connection()
             print("✅ Database connected successfully")
         except Exception as e:
             print(f"❌ Database connection failed: {e}")
@@ -30,9 +45,54 @@ class DatabaseManager:
         """Ensure database connection is alive"""
         if self.connection is None or self.connection.closed:
             self.connect()
+
+    def _rollback_quietly(self):
+        """Roll back a failed query; the connection itself may be gone"""
+        try:
+            if self.connection is not None and not self.connection.closed:
+                self.connection.rollback()
+        except Exception:
+            pass
+
+    def ping(self, max_age: float = 5.0) -> bool:
+        """Check that the database answers a query.
+        
+        Uses a short-lived connection: rolling back the shared one could
+        discard another thread's uncommitted insert. The result is reused for
+        `max_age` seconds so frequent readiness probes do not churn connections.
+        """
+        now = time.monotonic()
+        if self._ping_result is not None and now - self._ping_at < max_age:
+            return self._ping_result
+        self._ping_result = self._ping_uncached()
+        self._ping_at = now
+        return self._ping_result
+    
+    def _ping_uncached(self) -> bool:
+        connection = None
+        try:
+            connection = self.new_connection()
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT 1")
+                cursor.fetchone()
+            return True
+        except Exception as e:
+            print(f"Database ping failed: {e}")
+            return False
+        finally:
+            if connection is not None:
+                connection.close()
     
-    def search_parts_by_name(self, query: str, limit: int = 10) -> List[Dict]:
-        """Search parts by name or description"""
+    def search_parts_by_name(self, query: str, limit: int = 10, mode: str = 'ilike',
+                             min_score: float = 0.0) -> List[Dict]:
+        """Search parts by name or description
+        
+        mode='semantic' ranks by embedding similarity instead of ILIKE, which
+        also matches synonyms and French/English variants of a part name.
+        """
+        if mode == 'semantic' and self.vector_index is not None:
+            return self._semantic_search(query, limit, min_score)
+        
         self.ensure_connection()
         try:
             with self.connection.cursor(cursor_factory=RealDictCursor) as cursor:
@@ -58,10 +118,77 @@ class DatabaseManager:
             print(f"Error searching parts: {e}")
             return []
     
+    def load_product_names(self) -> List:
+        """(internal_reference, product_name) for every product, for the vector index"""
+        # Full table scan on a background thread: a dedicated connection keeps
+        # request commits from invalidating the named cursor
+        connection = self.new_connection()
+        try:
+            with connection.cursor('vector_index_load') as cursor:
+                cursor.itersize = 10000
+                cursor.execute("SELECT internal_reference, product_name FROM products")
+                return [(ref, name or '') for ref, name in cursor]
+        finally:
+            connection.close()
+    
+    def _sync_vector_index(self):
+        """Re-embed changed products; full (re)builds run in the background"""
+        if not self.vector_index.built:
+            # Keeps serving the previous index (or nothing) until the build lands
+            self.vector_index.rebuild_async(self.load_product_names)
+            return
+        
+        stale = self.vector_index.take_stale()
+        if stale:
+            with self.connection.cursor() as cursor:
+                cursor.execute("""
+                    SELECT internal_reference, product_name
+                    FROM products
+                    WHERE internal_reference = ANY(%s)
+                """, (stale,))
+                found = [(ref, name or '') for ref, name in cursor.fetchall()]
+            self.vector_index.remove(set(stale) - {ref for ref, _ in found})
+            self.vector_index.upsert(found)
+    
+    def _semantic_search(self, query: str, limit: int, min_score: float) -> List[Dict]:
+        """Rank products by vector similarity, then read current stock and price"""
+        self.ensure_connection()
+        try:
+            self._sync_vector_index()
+            hits = [(ref, score) for ref, score in self.vector_index.search([query], limit)[0]
+                    if score >= min_score]
+            if not hits:
+                return []
+            with self.connection.cursor(cursor_factory=RealDictCursor) as cursor:
+                sql = """
+                    SELECT internal_reference, product_name, quantity_on_hand, sales_price
+                    FROM products
+                    WHERE internal_reference = ANY(%s)
+                """
+                cursor.execute(sql, ([ref for ref, _ in hits],))
+                rows = {row['internal_reference']: dict(row) for row in cursor.fetchall()}
+            results = []
+            for ref, score in hits:
+                if ref in rows:
+                    rows[ref]['score'] = round(score, 4)
+                    results.append(rows[ref])
+            return results
+        except Exception as e:
+            print(f"Error in semantic search: {e}")
+            self._rollback_quietly()
+            return []
+    
     def search_by_serial(self, serial: str) -> Optional[Dict]:
         """Search part by exact serial number"""
-        self.ensure_connection()
+        cache_key = ('serial', serial)
+        if self.search_cache is not None:
+            cached = self.search_cache.get(cache_key)
+            if cached is not MISS:
+                return dict(cached) if cached else None
+            generation = self.search_cache.generation
+
         try:
+            self.ensure_connection()
             with self.connection.cursor(cursor_factory=RealDictCursor) as cursor:
                 sql = """
                     SELECT internal_reference, product_name, quantity_on_hand, sales_price
@@ -70,13 +197,71 @@ class DatabaseManager:
                 """
                 cursor.execute(sql, (serial,))
                 result = cursor.fetchone()
-                return dict(result) if result else None
+                result = dict(result) if result else None
+                if self.search_cache is not None:
+                    # Cache misses too, keyed on the serial so an insert invalidates them
+                    self.search_cache.put(cache_key, dict(result) if result else None, [serial],
+                                          generation)
+                return result
         except Exception as e:
             print(f"Error searching by serial: {e}")
+            self._rollback_quietly()
+            if self.snapshot is not None:
+                return self.snapshot.get(serial)
             return None
     
+    def search_by_serials(self, serials: List[str]) -> Dict[str, Optional[Dict]]:
+        """Look up many exact serial numbers with a single query"""
+        found: Dict[str, Optional[Dict]] = {}
+        missing = []
+        generation = self.search_cache.generation if self.search_cache is not None else None
+        for serial in serials:
+            if self.search_cache is not None:
+                cached = self.search_cache.get(('serial', serial))
+                if cached is not MISS:
+                    found[serial] = dict(cached) if cached else None
+                    continue
+            missing.append(serial)
+        
+        if missing:
+            try:
+                self.ensure_connection()
+                with self.connection.cursor(cursor_factory=RealDictCursor) as cursor:
+                    sql = """
+                        SELECT internal_reference, product_name, quantity_on_hand, sales_price
+                        FROM products
+                        WHERE internal_reference = ANY(%s)
+                    """
+                    cursor.execute(sql, (missing,))
+                    rows = {row['internal_reference']: dict(row) for row in cursor.fetchall()}
+                for serial in missing:
+                    result = rows.get(serial)
+                    found[serial] = result
+                    if self.search_cache is not None:
+                        self.search_cache.put(('serial', serial), dict(result) if result else None, [serial],
+                                              generation)
+            except Exception as e:
+                print(f"Error searching by serials: {e}")
+                self._rollback_quietly()
+                fallback = self.snapshot.get_many(missing) if self.snapshot is not None else {}
+                for serial in missing:
+                    found[serial] = fallback.get(serial)
+        
+        return {serial: found[serial] for serial in serials}
+    
     def search_parts_for_vehicle(self, brand: str, model: str, year: str, part_name: str) -> List[Dict]:
         """Search parts for specific vehicle"""
+        # ILIKE is case-insensitive and year is not part of the query, so
+        # normalizing here lets equivalent searches share one cache entry
+        brand, model, part_name = (' '.join(value.lower().split()) if value else None
+                                   for value in (brand, model, part_name))
+        cache_key = ('vehicle', brand, model, part_name)
+        if self.search_cache is not None:
+            cached = self.search_cache.get(cache_key)
+            if cached is not MISS:
+                return [dict(row) for row in cached]
+            generation = self.search_cache.generation
+        
         self.ensure_connection()
         try:
             with self.connection.cursor(cursor_factory=RealDictCursor) as cursor:
@@ -111,8 +296,11 @@ class DatabaseManager:
                 brand_pattern = f'%{brand}%' if brand else '%'
                 
                 cursor.execute(sql, (search_pattern, part_pattern, brand_pattern))
-                results = cursor.fetchall()
-                return [dict(row) for row in results]
+                results = [dict(row) for row in cursor.fetchall()]
+                if self.search_cache is not None:
+                    self.search_cache.put(cache_key, [dict(row) for row in results],
+                                          [row['internal_reference'] for row in results], generation)
+                return results
         except Exception as e:
             print(f"Error searching for vehicle parts: {e}")
             return []
@@ -133,7 +321,7 @@ class DatabaseManager:
                 self.connection.commit()
         except Exception as e:
             print(f"Error saving chat session: {e}")
-            self.connection.rollback()
+            self._rollback_quietly()
     
     def save_message(self, session_id: str, role: str, message: str, metadata: Dict = None):
         """Save chat message to history"""
@@ -149,7 +337,7 @@ class DatabaseManager:
                 self.connection.commit()
         except Exception as e:
             print(f"Error saving message: {e}")
-            self.connection.rollback()
+            self._rollback_quietly()
     
     def save_contact_request(self, session_id: str, customer_name: str, phone: str, 
                            email: str, requested_part: str, vehicle_info: Dict = None):
@@ -168,7 +356,7 @@ class DatabaseManager:
                 return True
         except Exception as e:
             print(f"Error saving contact request: {e}")
-            self.connection.rollback()
+            self._rollback_quietly()
             return False
     
     def get_chat_history(self, session_id: str, limit: int = 10) -> List[Dict]:
@@ -190,6 +378,89 @@ class DatabaseManager:
             print(f"Error getting chat history: {e}")
             return []
     
+    def get_demand(self, days: int = 30, limit: int = 50, group_by: str = 'part',
+                   source: str = None, exclude_source: str = None) -> List[Dict]:
+        """Aggregate the demand_daily rollup over the last `days` days"""
+        group_columns = {
+            'part': ['part'],
+            'vehicle': ['part', 'brand', 'model', 'year'],
+            'day': ['day'],
+        }[group_by]
+        self.ensure_connection()
+        try:
+            with self.connection.cursor(cursor_factory=RealDictCursor) as cursor:
+                columns = ', '.join(group_columns)
+                sql = f"""
+                    SELECT {columns}, SUM(requests)::int AS requests
+                    FROM demand_daily
+                    WHERE day > current_date - %s
+                      AND (%s IS NULL OR source = %s)
+                      AND (%s IS NULL OR source <> %s)
+                    GROUP BY {columns}
+                    ORDER BY requests DESC, {columns}
+                    LIMIT %s
+                """
+                cursor.execute(sql, (days, source, source, exclude_source, exclude_source, limit))
+                rows = [dict(row) for row in cursor.fetchall()]
+                for row in rows:
+                    if 'day' in row:
+                        row['day'] = row['day'].isoformat()
+                return rows
+        except Exception as e:
+            print(f"Error getting demand analytics: {e}")
+            self._rollback_quietly()
+            return []
+
+    def load_suggestion_sources(self, days: int = 90, min_hits: int = 3):
+        """Distinct product names with their total stock, plus vehicles and part
+        queries from recent successful searches.
+        
+        Products sharing a name become one suggestion, which keeps the index
+        small for catalogues listing the same part under many references.
+        Only searches that found parts count (search_hits_daily), and only once
+        several customers made them, so one-off free text is never suggested.
+        """
+        # Runs on a background thread: a dedicated connection keeps request
+        # commits from invalidating the named cursor, and our rollbacks from
+        # touching their transactions
+        connection = self.new_connection()
+        try:
+            with connection.cursor('suggest_index_load') as cursor:
+                cursor.itersize = 10000
+                cursor.execute("""
+                    SELECT min(internal_reference), product_name, SUM(quantity_on_hand)
+                    FROM products
+                    WHERE product_name <> ''
+                    GROUP BY product_name
+                """)
+                products = list(cursor)
+            connection.rollback()
+
+            vehicles, queries = [], []
+            try:
+                with connection.cursor() as cursor:
+                    cursor.execute("""
+                        SELECT brand, model, SUM(hits)::int
+                        FROM search_hits_daily
+                        WHERE day > current_date - %s AND brand <> ''
+                        GROUP BY brand, model
+                        HAVING SUM(hits) >= %s
+                    """, (days, min_hits))
+                    vehicles = cursor.fetchall()
+                    cursor.execute("""
+                        SELECT part, SUM(hits)::int
+                        FROM search_hits_daily
+                        WHERE day > current_date - %s AND part <> ''
+                        GROUP BY part
+                        HAVING SUM(hits) >= %s
+                    """, (days, min_hits))
+                    queries = cursor.fetchall()
+            except Exception as e:
+                print(f"⚠️ No search statistics for suggestions: {e}")
+            return products, vehicles, queries
+        finally:
+            connection.close()
+    
     def close(self):
         """Close database connection"""
         if self.connection:
@@ -1,19 +1,108 @@
 import requests
 import json
+import os
+import time
 from typing import Dict, List, Optional
 from config import Config
 from conversation_manager import ConversationState, SessionContext
+from intent_classifier import IntentClassifier
+from llm_routing import UsageTracker, routes_from_config
 
 class DeepSeekService:
     def __init__(self):
         self.config = Config()
         self.api_key = self.config.DEEPSEEK_API_KEY
         self.base_url = self.config.DEEPSEEK_BASE_URL
+        self._reachable = None
+        self._reachable_checked = 0.0
+        self.routes = routes_from_config(self.config)
+        self.usage = UsageTracker()
+        self.intent_classifier = self._load_intent_classifier()
+        self.confidence_threshold = self.config.INTENT_CONFIDENCE_THRESHOLD
         
+    def _load_intent_classifier(self) -> Optional[IntentClassifier]:
+        """Load the local classifier if a trained model is available"""
+        path = self.config.INTENT_MODEL_PATH
+        if not os.path.isfile(path):
+            return None
+        try:
+            classifier = IntentClassifier.load(path)
+            print(f"✅ Intent classifier loaded ({', '.join(classifier.models)})")
+            return classifier
+        except Exception as e:
+            print(f"⚠️ Could not load intent classifier: {e}")
+            return None
+    
+    def _local_intent(self, message: str, context: SessionContext) -> Optional[Dict]:
+        """Answer label-only states locally when the classifier is confident"""
+        if self.intent_classifier is None:
+            return None
+        task = self.intent_classifier.task_for_state(context.state)
+        if task is None:
+            return None
+        label, confidence = self.intent_classifier.predict_one(task, message)
+        if confidence < self.confidence_threshold:
+            return None
+        
+        if task == 'search_method':
+            serial = label == 'serial'
+            return {
+                "intent": "method_selected",
+                "search_method": label,
+                "next_state": "collect_serial" if serial else "collect_vehicle_info",
+                "response": "Please provide the serial number" if serial else "Please provide your vehicle details (brand, model, year)",
+                "confidence": confidence,
+                "source": "classifier"
+            }
+        if task == 'confirmation':
+            confirmed = label == 'yes'
+            return {
+                "intent": "vehicle_confirmed" if confirmed else "vehicle_rejected",
+                "confirmed": confirmed,
+                "next_state": "collect_part_name" if confirmed else "collect_vehicle_info",
+                "response": "Great! Now tell me which spare part you need." if confirmed else "Okay, please re-enter your vehicle details (brand, model, year).",
+                "confidence": confidence,
+                "source": "classifier"
+            }
+        if task == 'results_action' and label != 'other':
+            return {
+                "intent": label,
+                "next_state": "collect_contact" if label == 'order' else "search_method_selection",
+                "response": "Please share your contact information to order." if label == 'order' else "How would you like to search?",
+                "confidence": confidence,
+                "source": "classifier"
+            }
+        return None
+    
+    def check_reachable(self, timeout: float = 2.0, max_age: float = 30.0) -> bool:
+        """Check that the API answers, caching the result for `max_age` seconds"""
+        if self._reachable is not None and time.monotonic() - self._reachable_checked < max_age:
+            return self._reachable
+        try:
+            response = requests.get(
+                f"{self.base_url}/models",
+                headers={"Authorization": f"Bearer {self.api_key}"},
+                timeout=timeout
+            )
+            self._reachable = response.status_code < 500
+        except Exception as e:
+            print(f"DeepSeek reachability check failed: {e}")
+            self._reachable = False
+        self._reachable_checked = time.monotonic()
+        return self._reachable
+    
     def analyze_intent(self, message: str, context: SessionContext) -> Dict:
         """Analyze user intent using DeepSeek API"""
         
+        state = context.state.value
+        local = self._local_intent(message, context)
+        if local is not None:
+            self.usage.record_local(state)
+            return local
+        
         system_prompt = self._build_system_prompt(context)
+        route = self.routes.get(state, self.routes['default'])
+        started = time.monotonic()
         
         try:
             response = requests.post(
@@ -23,26 +112,29 @@ class DeepSeekService:
                     "Content-Type": "application/json"
                 },
                 json={
-                    "model": "deepseek-chat",
                     "messages": [
                         {"role": "system", "content": system_prompt},
                         {"role": "user", "content": message}
                     ],
-                    "temperature": 0.3,
-                    "max_tokens": 500
-                }
+                    **route.payload()
+                },
+                timeout=route.timeout
             )
             
             if response.status_code == 200:
                 result = response.json()
+                self.usage.record_call(state, route.model, time.monotonic() - started, result.get('usage'))
                 ai_response = result['choices'][0]['message']['content']
+                context.last_ai_raw = ai_response
                 return self._parse_ai_response(ai_response, context)
             else:
                 print(f"DeepSeek API error: {response.status_code}")
+                self.usage.record_call(state, route.model, time.monotonic() - started, None, ok=False)
                 return self._fallback_response(message, context)
                 
         except Exception as e:
             print(f"DeepSeek service error: {e}")
+            self.usage.record_call(state, route.model, time.monotonic() - started, None, ok=False)
             return self._fallback_response(message, context)
     
     def _build_system_prompt(self, context: SessionContext) -> str:
@@ -168,11 +260,11 @@ class DeepSeekService:
             specific_prompt = state_prompts[context.state]
             
             if context.state == ConversationState.CONFIRM_VEHICLE:
-                specific_prompt = specific_prompt.format(
-                    brand=context.vehicle_brand or "Unknown",
-                    model=context.vehicle_model or "Unknown",
-                    year=context.vehicle_year or "Unknown"
-                )
+                # str.format would trip over the literal JSON braces in the prompt
+                specific_prompt = (specific_prompt
+                    .replace("{brand}", context.vehicle_brand or "Unknown")
+                    .replace("{model}", context.vehicle_model or "Unknown")
+                    .replace("{year}", context.vehicle_year or "Unknown"))
             
             prompt += specific_prompt
         
@@ -209,6 +301,10 @@ class DeepSeekService:
         }
 
         
+    def fallback_intent(self, message: str, context: SessionContext) -> Dict:
+        """Deterministic intent analysis without calling the API (used under load)"""
+        return self._fallback_response(message, context)
+    
     def _fallback_response(self, message: str, context: SessionContext) -> Dict:
         """Provide fallback response when API fails"""
         
@@ -0,0 +1,182 @@
+"""Daily demand rollups built from contact requests and unmatched searches.
+
+Usage:
+    python demand_rollup.py --install            # create table and triggers
+    python demand_rollup.py --backfill           # rebuild counts from raw history
+
+Rows in demand_daily are kept up to date by triggers: one per contact_requests
+insert and one per chat_messages insert whose metadata carries a "demand"
+entry (app.py adds it when a search finds nothing). Dashboards read the
+precomputed counts instead of scanning the raw tables.
+
+The same chat_messages trigger also counts successful part searches
+("search_hit" metadata) in search_hits_daily, which ranks typeahead
+suggestions by what customers actually found.
+"""
+import argparse
+from typing import List
+
+from db_manager import DatabaseManager
+
+SCHEMA_SQL = """
+    CREATE TABLE IF NOT EXISTS demand_daily (
+        day DATE NOT NULL,
+        source TEXT NOT NULL,
+        part TEXT NOT NULL,
+        brand TEXT NOT NULL DEFAULT '',
+        model TEXT NOT NULL DEFAULT '',
+        year TEXT NOT NULL DEFAULT '',
+        requests INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (day, source, part, brand, model, year)
+    );
+    CREATE INDEX IF NOT EXISTS demand_daily_part_idx ON demand_daily (part, day);
+
+    CREATE TABLE IF NOT EXISTS search_hits_daily (
+        day DATE NOT NULL,
+        part TEXT NOT NULL,
+        brand TEXT NOT NULL DEFAULT '',
+        model TEXT NOT NULL DEFAULT '',
+        hits INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (day, part, brand, model)
+    );
+
+    CREATE OR REPLACE FUNCTION demand_normalize(value TEXT) RETURNS TEXT AS $$
+        SELECT coalesce(lower(btrim(regexp_replace(value, '\\s+', ' ', 'g'))), '')
+    $$ LANGUAGE sql IMMUTABLE;
+
+    CREATE OR REPLACE FUNCTION demand_record(p_day DATE, p_source TEXT, p_part TEXT,
+                                             p_brand TEXT, p_model TEXT, p_year TEXT)
+    RETURNS void AS $$
+        INSERT INTO demand_daily (day, source, part, brand, model, year, requests)
+        VALUES (p_day, p_source, demand_normalize(p_part), demand_normalize(p_brand),
+                demand_normalize(p_model), demand_normalize(p_year), 1)
+        ON CONFLICT (day, source, part, brand, model, year)
+        DO UPDATE SET requests = demand_daily.requests + 1
+    $$ LANGUAGE sql;
+
+    CREATE OR REPLACE FUNCTION demand_from_contact_request() RETURNS trigger AS $$
+    DECLARE
+        vehicle JSONB := NEW.vehicle_info::jsonb;
+    BEGIN
+        PERFORM demand_record(current_date, 'contact_request', NEW.requested_part,
+                              vehicle ->> 'brand', vehicle ->> 'model', vehicle ->> 'year');
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql;
+
+    CREATE OR REPLACE FUNCTION demand_from_chat_message() RETURNS trigger AS $$
+    DECLARE
+        demand JSONB := NEW.metadata::jsonb -> 'demand';
+        hit JSONB := NEW.metadata::jsonb -> 'search_hit';
+    BEGIN
+        IF demand IS NOT NULL AND jsonb_typeof(demand) = 'object' THEN
+            PERFORM demand_record(current_date, coalesce(demand ->> 'source', 'unmatched_search'),
+                                  demand ->> 'part', demand ->> 'brand',
+                                  demand ->> 'model', demand ->> 'year');
+        END IF;
+        IF hit IS NOT NULL AND jsonb_typeof(hit) = 'object' THEN
+            INSERT INTO search_hits_daily (day, part, brand, model, hits)
+            VALUES (current_date, demand_normalize(hit ->> 'part'),
+                    demand_normalize(hit ->> 'brand'), demand_normalize(hit ->> 'model'), 1)
+            ON CONFLICT (day, part, brand, model)
+            DO UPDATE SET hits = search_hits_daily.hits + 1;
+        END IF;
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql;
+
+    DROP TRIGGER IF EXISTS contact_requests_demand ON contact_requests;
+    CREATE TRIGGER contact_requests_demand
+        AFTER INSERT ON contact_requests
+        FOR EACH ROW EXECUTE FUNCTION demand_from_contact_request();
+
+    DROP TRIGGER IF EXISTS chat_messages_demand ON chat_messages;
+    CREATE TRIGGER chat_messages_demand
+        AFTER INSERT ON chat_messages
+        FOR EACH ROW WHEN (NEW.metadata IS NOT NULL)
+        EXECUTE FUNCTION demand_from_chat_message();
+"""
+
+# Full rebuild from the raw tables, for history that predates the triggers
+BACKFILL_SQL = """
+    TRUNCATE demand_daily;
+
+    INSERT INTO demand_daily (day, source, part, brand, model, year, requests)
+    SELECT day, source, part, brand, model, year, count(*)
+    FROM (
+        SELECT created_at::date AS day,
+               'contact_request' AS source,
+               demand_normalize(requested_part) AS part,
+               demand_normalize(vehicle_info::jsonb ->> 'brand') AS brand,
+               demand_normalize(vehicle_info::jsonb ->> 'model') AS model,
+               demand_normalize(vehicle_info::jsonb ->> 'year') AS year
+        FROM contact_requests
+        UNION ALL
+        SELECT timestamp::date,
+               coalesce(metadata::jsonb -> 'demand' ->> 'source', 'unmatched_search'),
+               demand_normalize(metadata::jsonb -> 'demand' ->> 'part'),
+               demand_normalize(metadata::jsonb -> 'demand' ->> 'brand'),
+               demand_normalize(metadata::jsonb -> 'demand' ->> 'model'),
+               demand_normalize(metadata::jsonb -> 'demand' ->> 'year')
+        FROM chat_messages
+        WHERE role = 'assistant' AND jsonb_typeof(metadata::jsonb -> 'demand') = 'object'
+    ) raw
+    GROUP BY day, source, part, brand, model, year;
+
+    TRUNCATE search_hits_daily;
+
+    INSERT INTO search_hits_daily (day, part, brand, model, hits)
+    SELECT timestamp::date,
+           demand_normalize(metadata::jsonb -> 'search_hit' ->> 'part') AS part,
+           demand_normalize(metadata::jsonb -> 'search_hit' ->> 'brand') AS brand,
+           demand_normalize(metadata::jsonb -> 'search_hit' ->> 'model') AS model,
+           count(*)
+    FROM chat_messages
+    WHERE role = 'assistant' AND jsonb_typeof(metadata::jsonb -> 'search_hit') = 'object'
+    GROUP BY 1, 2, 3, 4;
+"""
+
+
+def install_demand_rollup(connection):
+    """Create demand_daily and the triggers that maintain it"""
+    with connection.cursor() as cursor:
+        cursor.execute(SCHEMA_SQL)
+    connection.commit()
+
+
+def backfill_demand_rollup(connection) -> int:
+    """Recompute demand_daily from contact_requests and chat_messages"""
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(BACKFILL_SQL)
+            cursor.execute("SELECT count(*) FROM demand_daily")
+            rows = cursor.fetchone()[0]
+        connection.commit()
+        return rows
+    except Exception:
+        connection.rollback()
+        raise
+
+
+def main(argv: List[str] = None):
+    parser = argparse.ArgumentParser(description='Maintain the demand_daily rollup table')
+    parser.add_argument('--install', action='store_true', help='create the table and triggers')
+    parser.add_argument('--backfill', action='store_true', help='rebuild counts from raw history')
+    args = parser.parse_args(argv)
+    if not args.install and not args.backfill:
+        parser.error('nothing to do, pass --install and/or --backfill')
+
+    db = DatabaseManager()
+    try:
+        if args.install:
+            install_demand_rollup(db.connection)
+            print("✅ demand_daily table and triggers installed")
+        if args.backfill:
+            rows = backfill_demand_rollup(db.connection)
+            print(f"✅ demand_daily rebuilt ({rows} rollup rows)")
+    finally:
+        db.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,258 @@
+"""Local intent classifier for the short label-only conversation turns.
+
+Usage:
+    python intent_classifier.py --corpus messages.jsonl
+    python intent_classifier.py --from-db --out models/intent_classifier.npz
+
+Messages are turned into hashed character n-gram features and scored by one
+linear softmax model per task. Training data comes from logged chat_messages:
+the state each user message arrived in plus the recorded LLM output or the
+state the turn moved to (see replay_extractors.build_turns).
+"""
+import argparse
+import json
+import os
+import zlib
+from itertools import groupby
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from conversation_manager import ConversationState
+
+N_FEATURES = 2 ** 15
+NGRAM_SIZES = (2, 3, 4)
+BIAS_FEATURE = '<s>'
+
+# Task name per conversation state the classifier can answer
+STATE_TASKS = {
+    ConversationState.SEARCH_METHOD_SELECTION: 'search_method',
+    ConversationState.CONFIRM_VEHICLE: 'confirmation',
+    ConversationState.SHOW_RESULTS: 'results_action',
+}
+
+
+def _features(text: str, n_features: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Hashed, L2-normalized n-gram counts for one message"""
+    normalized = ' ' + ' '.join(text.lower().split()) + ' '
+    grams = [BIAS_FEATURE]
+    for n in NGRAM_SIZES:
+        grams.extend(normalized[i:i + n] for i in range(len(normalized) - n + 1))
+    grams.extend('w:' + word for word in normalized.split())
+    hashed = np.fromiter((zlib.crc32(gram.encode('utf-8')) for gram in grams),
+                         dtype=np.int64, count=len(grams)) % n_features
+    indices, counts = np.unique(hashed, return_counts=True)
+    values = counts.astype(np.float32)
+    values /= np.sqrt(np.dot(values, values))
+    return indices, values
+
+
+def featurize(texts: Sequence[str], n_features: int = N_FEATURES) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Sparse batch as (indices, values, row offsets) for np.add.reduceat"""
+    rows = [_features(text or '', n_features) for text in texts]
+    lengths = np.fromiter((len(indices) for indices, _ in rows), dtype=np.int64, count=len(rows))
+    offsets = np.zeros(len(rows), dtype=np.int64)
+    np.cumsum(lengths[:-1], out=offsets[1:])
+    indices = np.concatenate([indices for indices, _ in rows])
+    values = np.concatenate([values for _, values in rows])
+    return indices, values, offsets
+
+
+def _softmax(scores: np.ndarray) -> np.ndarray:
+    scores = scores - scores.max(axis=1, keepdims=True)
+    np.exp(scores, out=scores)
+    scores /= scores.sum(axis=1, keepdims=True)
+    return scores
+
+
+class LinearModel:
+    """Softmax regression over hashed sparse features"""
+
+    def __init__(self, labels: List[str], weights: np.ndarray, bias: np.ndarray):
+        self.labels = labels
+        self.weights = np.ascontiguousarray(weights, dtype=np.float32)
+        self.bias = np.ascontiguousarray(bias, dtype=np.float32)
+
+    def scores(self, indices: np.ndarray, values: np.ndarray, offsets: np.ndarray) -> np.ndarray:
+        contributions = self.weights[indices] * values[:, None]
+        return np.add.reduceat(contributions, offsets, axis=0) + self.bias
+
+    def predict_proba(self, indices, values, offsets) -> np.ndarray:
+        return _softmax(self.scores(indices, values, offsets))
+
+    @classmethod
+    def train(cls, texts: List[str], labels: List[str], n_features: int = N_FEATURES,
+              epochs: int = 20, learning_rate: float = 0.5, l2: float = 1e-5,
+              batch_size: int = 256, seed: int = 0) -> 'LinearModel':
+        """Mini-batch Adagrad on the cross-entropy loss"""
+        label_names = sorted(set(labels))
+        label_index = {name: i for i, name in enumerate(label_names)}
+        y = np.array([label_index[label] for label in labels], dtype=np.int64)
+        rows = [_features(text or '', n_features) for text in texts]
+
+        weights = np.zeros((n_features, len(label_names)), dtype=np.float32)
+        bias = np.zeros(len(label_names), dtype=np.float32)
+        weights_acc = np.full_like(weights, 1e-8)
+        bias_acc = np.full_like(bias, 1e-8)
+        model = cls(label_names, weights, bias)
+        rng = np.random.default_rng(seed)
+
+        for _ in range(epochs):
+            order = rng.permutation(len(rows))
+            for start in range(0, len(order), batch_size):
+                batch = order[start:start + batch_size]
+                lengths = np.array([len(rows[i][0]) for i in batch], dtype=np.int64)
+                offsets = np.zeros(len(batch), dtype=np.int64)
+                np.cumsum(lengths[:-1], out=offsets[1:])
+                indices = np.concatenate([rows[i][0] for i in batch])
+                values = np.concatenate([rows[i][1] for i in batch])
+
+                probs = model.predict_proba(indices, values, offsets)
+                probs[np.arange(len(batch)), y[batch]] -= 1
+                probs /= len(batch)
+
+                row_of_value = np.repeat(np.arange(len(batch)), lengths)
+                grad_w = np.zeros_like(model.weights)
+                np.add.at(grad_w, indices, values[:, None] * probs[row_of_value])
+                touched = np.unique(indices)
+                grad_w[touched] += l2 * model.weights[touched]
+                grad_b = probs.sum(axis=0)
+
+                weights_acc[touched] += grad_w[touched] ** 2
+                model.weights[touched] -= learning_rate * grad_w[touched] / np.sqrt(weights_acc[touched])
+                bias_acc += grad_b ** 2
+                model.bias -= learning_rate * grad_b / np.sqrt(bias_acc)
+
+        return model
+
+
+class IntentClassifier:
+    """One LinearModel per task, sharing the feature space"""
+
+    def __init__(self, models: Dict[str, LinearModel], n_features: int = N_FEATURES):
+        self.models = models
+        self.n_features = n_features
+
+    def task_for_state(self, state: ConversationState) -> Optional[str]:
+        task = STATE_TASKS.get(state)
+        return task if task in self.models else None
+
+    def predict(self, task: str, texts: Sequence[str]) -> List[Tuple[str, float]]:
+        """Batched prediction: (label, confidence) per text"""
+        model = self.models[task]
+        probs = model.predict_proba(*featurize(texts, self.n_features))
+        best = probs.argmax(axis=1)
+        return [(model.labels[i], float(probs[row, i])) for row, i in enumerate(best)]
+
+    def predict_one(self, task: str, text: str) -> Tuple[str, float]:
+        return self.predict(task, [text])[0]
+
+    def save(self, path: str):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        meta = {
+            'n_features': self.n_features,
+            'tasks': {task: model.labels for task, model in self.models.items()},
+        }
+        arrays = {'meta': np.array(json.dumps(meta))}
+        for task, model in self.models.items():
+            arrays[f'{task}__weights'] = model.weights
+            arrays[f'{task}__bias'] = model.bias
+        np.savez_compressed(path, **arrays)
+
+    @classmethod
+    def load(cls, path: str) -> 'IntentClassifier':
+        with np.load(path, allow_pickle=False) as data:
+            meta = json.loads(str(data['meta']))
+            models = {
+                task: LinearModel(labels, data[f'{task}__weights'], data[f'{task}__bias'])
+                for task, labels in meta['tasks'].items()
+            }
+        return cls(models, meta['n_features'])
+
+
+def label_turn(turn: Dict) -> Optional[Tuple[str, str]]:
+    """(task, label) for a replayed turn, or None when it carries no usable label"""
+    try:
+        state = ConversationState(turn.get('state'))
+    except ValueError:
+        return None
+    task = STATE_TASKS.get(state)
+    recorded = turn.get('ai_response') or {}
+    next_state = turn.get('next_state')
+    # Only a real LLM answer is a label; the keyword fallback and our own
+    # earlier predictions are also recorded as ai_response
+    from_llm = bool(turn.get('ai_raw'))
+
+    if task == 'search_method' and from_llm and recorded.get('search_method') in ('serial', 'part'):
+        return task, recorded['search_method']
+    if task == 'confirmation' and from_llm and isinstance(recorded.get('confirmed'), bool):
+        return task, 'yes' if recorded['confirmed'] else 'no'
+    # The next state follows the classifier's label when it answered the turn
+    if task == 'results_action' and next_state and recorded.get('source') != 'classifier':
+        if next_state == ConversationState.COLLECT_CONTACT.value:
+            return task, 'order'
+        if next_state == ConversationState.SEARCH_METHOD_SELECTION.value:
+            return task, 'search_another'
+        return task, 'other'
+    return None
+
+
+def collect_samples(rows) -> Dict[str, List[Tuple[str, str]]]:
+    from replay_extractors import build_turns
+
+    samples: Dict[str, List[Tuple[str, str]]] = {}
+    for _, group in groupby(rows, key=lambda r: r.get('session_id')):
+        for turn in build_turns(list(group)):
+            labelled = label_turn(turn)
+            if labelled:
+                task, label = labelled
+                samples.setdefault(task, []).append((turn['message'], label))
+    return samples
+
+
+def train(samples: Dict[str, List[Tuple[str, str]]], holdout: float = 0.1) -> Tuple[IntentClassifier, Dict]:
+    """Train every task with enough data and report held-out accuracy"""
+    models = {}
+    report = {}
+    for task, pairs in samples.items():
+        if len({label for _, label in pairs}) < 2:
+            report[task] = {'samples': len(pairs), 'skipped': 'needs at least two labels'}
+            continue
+        # Deterministic split on the message text so duplicates stay on one side
+        test = [p for p in pairs if zlib.crc32(p[0].encode('utf-8')) % 1000 < holdout * 1000]
+        fit = [p for p in pairs if zlib.crc32(p[0].encode('utf-8')) % 1000 >= holdout * 1000] or pairs
+        model = LinearModel.train([t for t, _ in fit], [l for _, l in fit])
+        models[task] = model
+        accuracy = None
+        if test:
+            predicted = IntentClassifier({task: model}).predict(task, [t for t, _ in test])
+            accuracy = round(sum(p[0] == l for p, (_, l) in zip(predicted, test)) / len(test), 4)
+        report[task] = {'samples': len(pairs), 'labels': model.labels, 'holdout_accuracy': accuracy}
+    return IntentClassifier(models), report
+
+
+def main(argv: List[str] = None):
+    from config import Config
+    from replay_extractors import read_chat_messages, read_corpus
+
+    parser = argparse.ArgumentParser(description='Train the local intent classifier')
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('--corpus', help='JSONL export of chat_messages')
+    source.add_argument('--from-db', action='store_true', help='read chat_messages from the database')
+    parser.add_argument('--out', default=Config.INTENT_MODEL_PATH, help='model file to write')
+    args = parser.parse_args(argv)
+
+    rows = read_chat_messages() if args.from_db else read_corpus(args.corpus)
+    classifier, report = train(collect_samples(rows))
+    for task, stats in report.items():
+        print(f"📊 {task}: {json.dumps(stats)}")
+
+    if not classifier.models:
+        print("❌ Not enough labelled turns to train any task")
+        return
+    classifier.save(args.out)
+    print(f"✅ Model written to {args.out}")
+
+
+if __name__ == '__main__':
+    main()
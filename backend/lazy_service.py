@@ -0,0 +1,87 @@
+import threading
+import time
+from typing import Any, Callable, Optional
+
+
+class ServiceUnavailable(Exception):
+    """Raised when a lazily built service cannot be constructed yet"""
+
+
+class LazyService:
+    """Build a service on first use (or in the background) instead of at import.
+
+    Attribute access is forwarded to the built instance, so a LazyService can
+    stand in for the object itself. Only one thread builds at a time and a
+    failed build is retried at most once per `retry_interval` seconds; while a
+    build is running or in between retries, callers get ServiceUnavailable
+    immediately instead of waiting on the connection attempt.
+    """
+
+    def __init__(self, name: str, factory: Callable[[], Any], retry_interval: float = 5.0):
+        self._name = name
+        self._factory = factory
+        self._retry_interval = retry_interval
+        self._instance = None
+        self._lock = threading.Lock()
+        self._last_attempt = 0.0
+        self._last_error: Optional[str] = None
+
+    @property
+    def name(self) -> str:
+        return self._name
+
+    @property
+    def ready(self) -> bool:
+        return self._instance is not None
+
+    @property
+    def last_error(self) -> Optional[str]:
+        return self._last_error
+
+    def get(self) -> Any:
+        instance = self._instance
+        if instance is not None:
+            return instance
+        if not self._lock.acquire(blocking=False):
+            raise ServiceUnavailable(f"{self._name} unavailable: still starting")
+        try:
+            if self._instance is not None:
+                return self._instance
+            if time.monotonic() - self._last_attempt < self._retry_interval and self._last_error:
+                raise ServiceUnavailable(f"{self._name} unavailable: {self._last_error}")
+            self._last_attempt = time.monotonic()
+            try:
+                self._instance = self._factory()
+                self._last_error = None
+            except Exception as e:
+                self._last_error = str(e)
+                raise ServiceUnavailable(f"{self._name} unavailable: {e}") from e
+            return self._instance
+        finally:
+            self._lock.release()
+
+    def warm(self, stop_event: threading.Event = None):
+        """Keep trying to build the service until it succeeds"""
+        while self._instance is None and not (stop_event and stop_event.is_set()):
+            try:
+                self.get()
+            except ServiceUnavailable:
+                time.sleep(self._retry_interval)
+
+    def __getattr__(self, attr):
+        # Only called for attributes not found on LazyService itself
+        if attr.startswith('_'):
+            raise AttributeError(attr)
+        return getattr(self.get(), attr)
+
+
+def warm_in_background(*services: LazyService) -> threading.Thread:
+    """Build services on a daemon thread so startup does not block on them"""
+    def run():
+        for service in services:
+            service.warm()
+            print(f"✅ {service.name} ready")
+
+    thread = threading.Thread(target=run, name='service-warmup', daemon=True)
+    thread.start()
+    return thread
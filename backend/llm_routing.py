@@ -0,0 +1,136 @@
+import json
+import threading
+from collections import deque
+from dataclasses import dataclass, field, fields, replace
+from typing import Dict, List, Optional
+
+
+@dataclass
+class LLMRoute:
+    """Request parameters for one conversation state"""
+    model: str = 'deepseek-chat'
+    max_tokens: int = 500
+    temperature: float = 0.3
+    stop: List[str] = field(default_factory=list)
+    timeout: float = 20.0
+
+    def payload(self) -> Dict:
+        """Fields to merge into the chat/completions request body"""
+        body = {
+            'model': self.model,
+            'max_tokens': self.max_tokens,
+            'temperature': self.temperature,
+        }
+        if self.stop:
+            body['stop'] = self.stop
+        return body
+
+
+ROUTE_FIELDS = {f.name for f in fields(LLMRoute)}
+
+
+def _check_fields(where: str, values) -> Dict:
+    if not isinstance(values, dict):
+        raise ValueError(f"{where}: expected an object of route fields, got {values!r}")
+    unknown = sorted(set(values) - ROUTE_FIELDS)
+    if unknown:
+        raise ValueError(f"{where}: unknown route field(s) {', '.join(unknown)} "
+                         f"(allowed: {', '.join(sorted(ROUTE_FIELDS))})")
+    return values
+
+
+def parse_route_overrides(text: str) -> Dict[str, Dict]:
+    """Parse LLM_ROUTES_JSON: {"state": {"field": value}}, 'default' included"""
+    try:
+        overrides = json.loads(text or '{}')
+    except ValueError as e:
+        raise ValueError(f"LLM_ROUTES_JSON is not valid JSON: {e}") from e
+    if not isinstance(overrides, dict):
+        raise ValueError("LLM_ROUTES_JSON must be an object keyed by conversation state")
+    for state, values in overrides.items():
+        _check_fields(f"LLM_ROUTES_JSON[{state!r}]", values)
+    return overrides
+
+
+def build_routes(default: Dict, per_state: Dict[str, Dict],
+                 overrides: Dict[str, Dict] = None) -> Dict[str, LLMRoute]:
+    """Expand the Config route tables into LLMRoute objects ('default' included).
+
+    `overrides` are merged field by field over the built-in table, so
+    overriding one field of a state keeps its other tuned values.
+    """
+    overrides = overrides or {}
+    base = LLMRoute(**_check_fields('default route', {**default, **overrides.get('default', {})}))
+    routes = {'default': base}
+    for state in {**per_state, **overrides}:
+        if state == 'default':
+            continue
+        values = {**per_state.get(state, {}), **overrides.get(state, {})}
+        routes[state] = replace(base, **_check_fields(f"route {state!r}", values))
+    return routes
+
+
+def routes_from_config(config) -> Dict[str, LLMRoute]:
+    """Routes from Config, raising ValueError on a malformed LLM_ROUTES_JSON"""
+    return build_routes(config.LLM_DEFAULT_ROUTE, config.LLM_STATE_ROUTES,
+                        parse_route_overrides(config.LLM_ROUTES_JSON))
+
+
+class UsageTracker:
+    """Per-state call, token and latency counters for dashboards"""
+
+    def __init__(self, window: int = 1000):
+        self.window = window
+        self._lock = threading.Lock()
+        self._states: Dict[str, Dict] = {}
+
+    def _state(self, state: str) -> Dict:
+        stats = self._states.get(state)
+        if stats is None:
+            stats = {
+                'model': None,
+                'calls': 0,
+                'errors': 0,
+                'local': 0,
+                'prompt_tokens': 0,
+                'completion_tokens': 0,
+                'latencies': deque(maxlen=self.window),
+            }
+            self._states[state] = stats
+        return stats
+
+    def record_call(self, state: str, model: str, latency: float, usage: Optional[Dict], ok: bool = True):
+        with self._lock:
+            stats = self._state(state)
+            stats['model'] = model
+            stats['calls'] += 1
+            if not ok:
+                stats['errors'] += 1
+            stats['latencies'].append(latency)
+            if usage:
+                stats['prompt_tokens'] += usage.get('prompt_tokens', 0) or 0
+                stats['completion_tokens'] += usage.get('completion_tokens', 0) or 0
+
+    def record_local(self, state: str):
+        """A turn answered by the local classifier, no API call"""
+        with self._lock:
+            self._state(state)['local'] += 1
+
+    def snapshot(self) -> Dict[str, Dict]:
+        with self._lock:
+            report = {}
+            for state, stats in self._states.items():
+                latencies = sorted(stats['latencies'])
+                calls = stats['calls']
+                report[state] = {
+                    'model': stats['model'],
+                    'calls': calls,
+                    'errors': stats['errors'],
+                    'local': stats['local'],
+                    'prompt_tokens': stats['prompt_tokens'],
+                    'completion_tokens': stats['completion_tokens'],
+                    'avg_completion_tokens': round(stats['completion_tokens'] / calls, 1) if calls else None,
+                    'latency_p50_ms': round(latencies[len(latencies) // 2] * 1000, 1) if latencies else None,
+                    'latency_p95_ms': round(latencies[int(len(latencies) * 0.95)] * 1000, 1) if latencies else None,
+                }
+            return report
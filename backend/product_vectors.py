@@ -0,0 +1,305 @@
+import re
+import threading
+import time
+import unicodedata
+import zlib
+from typing import Callable, Dict, Iterable, List, Sequence, Tuple
+
+import numpy as np
+
+EMBEDDING_DIM = 128
+
+TOKEN_RE = re.compile(r'[a-z]+|\d+')
+
+STOPWORDS = {'de', 'du', 'des', 'la', 'le', 'les', 'pour', 'for', 'the', 'of', 'a', 'avec', 'with', 'et', 'and'}
+
+# French/English spare-part vocabulary mapped to one canonical token, so
+# "plaquettes de frein" and "brake pads" land on the same features
+SYNONYMS = {
+    'plaquette': 'pad', 'plaquettes': 'pad', 'pads': 'pad',
+    'frein': 'brake', 'freins': 'brake', 'brakes': 'brake',
+    'filtre': 'filter', 'filtres': 'filter', 'filters': 'filter',
+    'huile': 'oil',
+    'batterie': 'battery', 'batteries': 'battery', 'accu': 'battery',
+    'amortisseur': 'shock', 'amortisseurs': 'shock', 'shocks': 'shock', 'absorber': 'shock',
+    'courroie': 'belt', 'courroies': 'belt', 'belts': 'belt', 'distribution': 'timing',
+    'bougie': 'plug', 'bougies': 'plug', 'plugs': 'plug',
+    'embrayage': 'clutch', 'demarreur': 'starter', 'alternateur': 'alternator',
+    'phare': 'headlight', 'phares': 'headlight', 'headlights': 'headlight',
+    'essuie': 'wiper', 'balai': 'wiper', 'balais': 'wiper', 'wipers': 'wiper',
+    'radiateur': 'radiator', 'pneu': 'tyre', 'pneus': 'tyre', 'tire': 'tyre', 'tires': 'tyre', 'tyres': 'tyre',
+    'disque': 'disc', 'disques': 'disc', 'discs': 'disc', 'disk': 'disc',
+    'pompe': 'pump', 'eau': 'water', 'carburant': 'fuel', 'gasoil': 'diesel',
+    'ampoule': 'bulb', 'ampoules': 'bulb', 'bulbs': 'bulb',
+    'rotule': 'joint', 'roulement': 'bearing', 'roulements': 'bearing', 'bearings': 'bearing',
+}
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase, strip accents, split letters from digits and map synonyms"""
+    text = unicodedata.normalize('NFKD', (text or '').lower())
+    text = ''.join(ch for ch in text if not unicodedata.combining(ch))
+    tokens = []
+    for token in TOKEN_RE.findall(text):
+        if token in STOPWORDS:
+            continue
+        tokens.append(SYNONYMS.get(token, token))
+    return tokens
+
+
+def embed(texts: Sequence[str], dim: int = EMBEDDING_DIM) -> np.ndarray:
+    """Signed feature hashing of tokens and token trigrams into unit vectors"""
+    rows, columns, values = [], [], []
+    for row, text in enumerate(texts):
+        for token in tokenize(text):
+            features = [(token, 1.0)]
+            padded = f'<{token}>'
+            if len(padded) > 4 and not token.isdigit():
+                features.extend((padded[i:i + 3], 0.5) for i in range(len(padded) - 2))
+            for feature, weight in features:
+                h = zlib.crc32(feature.encode('utf-8'))
+                rows.append(row)
+                columns.append(h % dim)
+                values.append(weight if h & 0x80000000 else -weight)
+
+    matrix = np.zeros((len(texts), dim), dtype=np.float32)
+    if rows:
+        np.add.at(matrix, (np.array(rows), np.array(columns)), np.array(values, dtype=np.float32))
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1
+    matrix /= norms
+    return matrix
+
+
+def _spherical_kmeans(vectors: np.ndarray, n_lists: int, iterations: int = 10,
+                      sample_size: int = 20000, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    if len(vectors) > sample_size:
+        vectors = vectors[rng.choice(len(vectors), sample_size, replace=False)]
+    # Duplicate names embed to identical vectors; seeding from two copies
+    # leaves twin centroids, one of which never gets a member
+    distinct = np.unique(vectors, axis=0)
+    n_lists = min(n_lists, len(distinct))
+    centroids = distinct[rng.choice(len(distinct), n_lists, replace=False)].copy()
+    for _ in range(iterations):
+        similarity = vectors @ centroids.T
+        assignment = similarity.argmax(axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignment, vectors)
+        empty = np.bincount(assignment, minlength=n_lists) == 0
+        if empty.any():
+            # Re-seed empty lists with the vectors their centroid fits worst
+            fit = similarity[np.arange(len(vectors)), assignment]
+            sums[empty] = vectors[np.argsort(fit)[:int(empty.sum())]]
+        norms = np.linalg.norm(sums, axis=1, keepdims=True)
+        degenerate = norms[:, 0] == 0
+        sums[degenerate] = centroids[degenerate]
+        norms[degenerate] = 1
+        centroids = sums / norms
+    return np.ascontiguousarray(centroids, dtype=np.float32)
+
+
+class ProductVectorIndex:
+    """IVF (inverted file) approximate nearest neighbour index over product names.
+
+    Vectors live in one contiguous float32 matrix ordered by list, so probing
+    a list is a single slice and a matrix-vector product. Added or renamed
+    products go to a small exhaustive-scan buffer and replaced rows are
+    masked out; the index repacks itself once the buffer grows past
+    `rebuild_ratio` of the main matrix.
+    """
+
+    def __init__(self, dim: int = EMBEDDING_DIM, nprobe: int = 8, rebuild_ratio: float = 0.1,
+                 retry_interval: float = 60.0):
+        self.dim = dim
+        self.nprobe = nprobe
+        self.rebuild_ratio = rebuild_ratio
+        self.retry_interval = retry_interval
+        self._lock = threading.RLock()
+        self._pending_refs: set = set()
+        self._rebuilding = threading.Lock()
+        self._generation = 0
+        self._failed_at = None
+        self._reset()
+
+    def _reset(self):
+        self.centroids = np.zeros((0, self.dim), dtype=np.float32)
+        self.vectors = np.zeros((0, self.dim), dtype=np.float32)
+        self.list_offsets = np.zeros(1, dtype=np.int64)
+        self.nonempty_lists = np.zeros(0, dtype=np.int64)
+        self.refs: List[str] = []
+        self.alive = np.zeros(0, dtype=bool)
+        self.extra_refs: List[str] = []
+        self.extra_vectors = np.zeros((0, self.dim), dtype=np.float32)
+        self.extra_alive = np.zeros(0, dtype=bool)
+        self.locations: Dict[str, Tuple[bool, int]] = {}  # ref -> (in_main, row)
+        self.built = False
+
+    def __len__(self):
+        return int(self.alive.sum() + self.extra_alive.sum())
+
+    def build(self, products: Iterable[Tuple[str, str]], batch_size: int = 10000):
+        """(Re)build the index from (internal_reference, product_name) pairs"""
+        refs, chunks, batch_refs, batch_names = [], [], [], []
+        for ref, name in products:
+            batch_refs.append(ref)
+            batch_names.append(name)
+            if len(batch_names) >= batch_size:
+                chunks.append(embed(batch_names, self.dim))
+                refs.extend(batch_refs)
+                batch_refs, batch_names = [], []
+        if batch_names:
+            chunks.append(embed(batch_names, self.dim))
+            refs.extend(batch_refs)
+        vectors = np.concatenate(chunks) if chunks else np.zeros((0, self.dim), dtype=np.float32)
+        self._pack(refs, vectors)
+
+    def _pack(self, refs: List[str], vectors: np.ndarray):
+        with self._lock:
+            self._reset()
+            if len(refs):
+                centroids = _spherical_kmeans(vectors, max(1, min(1024, int(np.sqrt(len(refs))))))
+                n_lists = len(centroids)
+                assignment = (vectors @ centroids.T).argmax(axis=1)
+                order = np.argsort(assignment, kind='stable')
+                counts = np.bincount(assignment, minlength=n_lists)
+                self.centroids = centroids
+                self.vectors = np.ascontiguousarray(vectors[order])
+                self.list_offsets = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+                self.nonempty_lists = np.flatnonzero(counts)
+                self.refs = [refs[i] for i in order]
+                self.alive = np.ones(len(refs), dtype=bool)
+                self.locations = {ref: (True, row) for row, ref in enumerate(self.refs)}
+            self.built = True
+
+    def mark_stale(self, ref: str):
+        """Record a product that changed; it is re-embedded on the next refresh"""
+        with self._lock:
+            self._pending_refs.add(ref)
+
+    def take_stale(self) -> List[str]:
+        with self._lock:
+            refs = list(self._pending_refs)
+            self._pending_refs.clear()
+            return refs
+
+    def remove(self, refs: Iterable[str]):
+        with self._lock:
+            for ref in refs:
+                location = self.locations.pop(ref, None)
+                if location is None:
+                    continue
+                in_main, row = location
+                (self.alive if in_main else self.extra_alive)[row] = False
+
+    def upsert(self, products: Sequence[Tuple[str, str]]):
+        """Add new products or re-embed renamed ones"""
+        if not products:
+            return
+        vectors = embed([name for _, name in products], self.dim)
+        with self._lock:
+            self.remove(ref for ref, _ in products)
+            start = len(self.extra_refs)
+            self.extra_refs.extend(ref for ref, _ in products)
+            self.extra_vectors = np.concatenate([self.extra_vectors, vectors])
+            self.extra_alive = np.concatenate([self.extra_alive, np.ones(len(products), dtype=bool)])
+            for offset, (ref, _) in enumerate(products):
+                self.locations[ref] = (False, start + offset)
+            if len(self.extra_refs) > max(1000, self.rebuild_ratio * len(self.refs)):
+                self._repack()
+
+    def _repack(self):
+        main = np.flatnonzero(self.alive)
+        extra = np.flatnonzero(self.extra_alive)
+        refs = [self.refs[i] for i in main] + [self.extra_refs[i] for i in extra]
+        vectors = np.concatenate([self.vectors[main], self.extra_vectors[extra]])
+        self._pack(refs, vectors)
+
+    def search(self, queries: Sequence[str], k: int = 10) -> List[List[Tuple[str, float]]]:
+        """Batched top-k search: (internal_reference, cosine score) per query"""
+        query_vectors = embed(queries, self.dim)
+        results = []
+        with self._lock:
+            # Only probe lists that hold vectors, so no probe is wasted on an empty one
+            lists = self.nonempty_lists
+            nprobe = min(self.nprobe, len(lists))
+            if nprobe:
+                centroid_scores = query_vectors @ self.centroids[lists].T
+                probes = lists[np.argpartition(-centroid_scores, nprobe - 1, axis=1)[:, :nprobe]]
+            for qi, query in enumerate(query_vectors):
+                if not query.any():
+                    results.append([])
+                    continue
+                candidate_refs, candidate_scores = [], []
+                if nprobe:
+                    for list_id in probes[qi]:
+                        start, end = self.list_offsets[list_id], self.list_offsets[list_id + 1]
+                        if start == end:
+                            continue
+                        scores = self.vectors[start:end] @ query
+                        live = self.alive[start:end]
+                        candidate_scores.append(scores[live])
+                        candidate_refs.extend(self.refs[start + i] for i in np.flatnonzero(live))
+                if len(self.extra_refs):
+                    live = np.flatnonzero(self.extra_alive)
+                    candidate_scores.append(self.extra_vectors[live] @ query)
+                    candidate_refs.extend(self.extra_refs[i] for i in live)
+                if not candidate_refs:
+                    results.append([])
+                    continue
+                scores = np.concatenate(candidate_scores)
+                top = min(k, len(scores))
+                best = np.argpartition(-scores, top - 1)[:top]
+                best = best[np.argsort(-scores[best])]
+                results.append([(candidate_refs[i], float(scores[i])) for i in best])
+        return results
+
+    def request_rebuild(self):
+        """Rebuild from the table on the next sync; the current index keeps serving"""
+        with self._lock:
+            self._pending_refs.clear()
+            self._generation += 1
+            self.built = False
+
+    def rebuild(self, loader: Callable[[], Iterable[Tuple[str, str]]]):
+        """Rebuild from `loader`; changes notified meanwhile stay pending"""
+        with self._lock:
+            generation = self._generation
+            self._pending_refs.clear()
+        self.build(loader())
+        with self._lock:
+            if generation != self._generation:
+                # Another rebuild was requested while this one was loading
+                self.built = False
+
+    def rebuild_async(self, loader: Callable[[], Iterable[Tuple[str, str]]]) -> bool:
+        """Start a background rebuild if the index needs one and none is running"""
+        if self.built:
+            return False
+        if self._failed_at is not None and time.monotonic() - self._failed_at < self.retry_interval:
+            return False
+        if not self._rebuilding.acquire(blocking=False):
+            return False
+
+        def run():
+            try:
+                self.rebuild(loader)
+                self._failed_at = None
+                print(f"✅ Vector index built ({len(self)} products)")
+            except Exception as e:
+                print(f"⚠️ Could not build vector index: {e}")
+                self._failed_at = time.monotonic()
+            finally:
+                self._rebuilding.release()
+
+        threading.Thread(target=run, name='vector-index-build', daemon=True).start()
+        return True
+
+    def handle_change(self, change: Dict):
+        """SearchCacheListener callback: re-embed products whose name changed"""
+        if change.get('bulk'):
+            self.request_rebuild()
+            return
+        for ref in change.get('renamed') or ():
+            self.mark_stale(ref)
+
@@ -0,0 +1,254 @@
+"""Replay recorded conversations through the local extractors.
+
+Usage:
+    python replay_extractors.py --corpus messages.jsonl
+    python replay_extractors.py --from-db --workers 8
+
+Each corpus line is one chat_messages row:
+    {"session_id": ..., "role": "user"|"assistant", "message": ..., "timestamp": ..., "metadata": {...}}
+rows of a session must be contiguous and in timestamp order (the --from-db
+export is ordered that way). Assistant metadata written by app.py carries the
+state after the turn plus the recorded LLM output (ai_raw / ai_response),
+which is what the extractors are compared against.
+"""
+import argparse
+import json
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import groupby, islice
+from typing import Dict, Iterator, List, Optional
+
+from conversation_manager import ConversationManager, ConversationState, SessionContext
+
+EXTRACTORS = ['extract_vehicle_info', 'extract_contact_info', '_parse_ai_response']
+
+
+def read_corpus(path: str) -> Iterator[Dict]:
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+
+
+def read_chat_messages() -> Iterator[Dict]:
+    """Stream chat_messages from the database, ordered by session"""
+    from psycopg2.extras import RealDictCursor
+    from db_manager import DatabaseManager
+
+    db = DatabaseManager()
+    try:
+        with db.connection.cursor('replay_export', cursor_factory=RealDictCursor) as cursor:
+            cursor.itersize = 10000
+            cursor.execute("""
+                SELECT session_id, role, message, timestamp, metadata
+                FROM chat_messages
+                ORDER BY session_id, timestamp
+            """)
+            for row in cursor:
+                yield dict(row)
+    finally:
+        db.close()
+
+
+def _metadata(row: Dict) -> Dict:
+    metadata = row.get('metadata') or {}
+    if isinstance(metadata, str):
+        try:
+            metadata = json.loads(metadata)
+        except ValueError:
+            metadata = {}
+    return metadata
+
+
+def build_turns(rows: List[Dict]) -> List[Dict]:
+    """Pair each user message with the state it was received in and the recorded AI output"""
+    turns = []
+    state = ConversationState.WELCOME.value
+    pending = None
+    for row in rows:
+        if row.get('role') == 'user':
+            pending = {'message': row.get('message') or '', 'state': state}
+            turns.append(pending)
+        elif row.get('role') == 'assistant':
+            metadata = _metadata(row)
+            state = metadata.get('state', state)
+            if pending is not None:
+                pending['ai_response'] = metadata.get('ai_response')
+                pending['ai_raw'] = metadata.get('ai_raw')
+                pending['next_state'] = state
+                pending = None
+    return turns
+
+
+def iter_sessions(rows: Iterator[Dict], chunk_size: int) -> Iterator[List[List[Dict]]]:
+    """Group rows into sessions of turns, `chunk_size` sessions at a time"""
+    sessions = (build_turns(list(group)) for _, group in groupby(rows, key=lambda r: r.get('session_id')))
+    while True:
+        chunk = list(islice(sessions, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _same(a, b) -> bool:
+    return (str(a).strip().lower() if a else None) == (str(b).strip().lower() if b else None)
+
+
+def _new_result() -> Dict:
+    return {
+        'sessions': 0,
+        'turns': 0,
+        'latencies': {name: [] for name in EXTRACTORS},
+        'agreement': {name: [0, 0] for name in EXTRACTORS},  # [agreed, compared]
+    }
+
+
+_conv_manager = None
+_deepseek = None
+
+
+def _init_worker():
+    global _conv_manager, _deepseek
+    from deepseek_service import DeepSeekService
+    _conv_manager = ConversationManager()
+    _deepseek = DeepSeekService()
+
+
+def replay_chunk(sessions: List[List[Dict]]) -> Dict:
+    """Run every extractor on a chunk of sessions (executed in a worker process)"""
+    if _conv_manager is None:
+        _init_worker()
+    result = _new_result()
+    latencies = result['latencies']
+    agreement = result['agreement']
+    clock = time.perf_counter
+
+    for turns in sessions:
+        result['sessions'] += 1
+        for turn in turns:
+            result['turns'] += 1
+            message = turn['message']
+            recorded = turn.get('ai_response') or {}
+            try:
+                state = ConversationState(turn['state'])
+            except ValueError:
+                state = ConversationState.WELCOME
+            context = SessionContext(session_id='replay', state=state)
+
+            start = clock()
+            vehicle = _conv_manager.extract_vehicle_info(message)
+            latencies['extract_vehicle_info'].append(clock() - start)
+
+            start = clock()
+            contact = _conv_manager.extract_contact_info(message)
+            latencies['extract_contact_info'].append(clock() - start)
+
+            if state == ConversationState.COLLECT_VEHICLE_INFO and recorded.get('vehicle_brand'):
+                agreement['extract_vehicle_info'][1] += 1
+                if all(_same(vehicle.get(field), recorded.get(f'vehicle_{field}'))
+                       for field in ('brand', 'model', 'year')):
+                    agreement['extract_vehicle_info'][0] += 1
+
+            if state == ConversationState.COLLECT_CONTACT and (recorded.get('phone') or recorded.get('email')):
+                agreement['extract_contact_info'][1] += 1
+                if _same(contact.get('phone'), recorded.get('phone')) and \
+                        _same(contact.get('email'), recorded.get('email')):
+                    agreement['extract_contact_info'][0] += 1
+
+            if turn.get('ai_raw'):
+                start = clock()
+                parsed = _deepseek._parse_ai_response(turn['ai_raw'], context)
+                latencies['_parse_ai_response'].append(clock() - start)
+                if turn.get('ai_response') is not None:
+                    agreement['_parse_ai_response'][1] += 1
+                    if parsed == turn['ai_response']:
+                        agreement['_parse_ai_response'][0] += 1
+
+    return result
+
+
+def _merge(total: Dict, part: Dict):
+    total['sessions'] += part['sessions']
+    total['turns'] += part['turns']
+    for name in EXTRACTORS:
+        total['latencies'][name].extend(part['latencies'][name])
+        total['agreement'][name][0] += part['agreement'][name][0]
+        total['agreement'][name][1] += part['agreement'][name][1]
+
+
+def _percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    index = min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))
+    return values[index]
+
+
+def summarize(total: Dict, elapsed: float) -> Dict:
+    report = {
+        'sessions': total['sessions'],
+        'turns': total['turns'],
+        'seconds': round(elapsed, 3),
+        'turns_per_sec': round(total['turns'] / elapsed) if elapsed > 0 else None,
+        'extractors': {},
+    }
+    for name in EXTRACTORS:
+        samples = sorted(total['latencies'][name])
+        agreed, compared = total['agreement'][name]
+        report['extractors'][name] = {
+            'calls': len(samples),
+            'mean_us': round(sum(samples) / len(samples) * 1e6, 2) if samples else None,
+            'p50_us': round(_percentile(samples, 50) * 1e6, 2),
+            'p95_us': round(_percentile(samples, 95) * 1e6, 2),
+            'p99_us': round(_percentile(samples, 99) * 1e6, 2),
+            'compared': compared,
+            'agreement': round(agreed / compared, 4) if compared else None,
+        }
+    return report
+
+
+def replay(rows: Iterator[Dict], workers: Optional[int] = None, chunk_size: int = 200) -> Dict:
+    total = _new_result()
+    started = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+        # Keep a bounded number of chunks in flight so the corpus is streamed
+        max_pending = (workers or os.cpu_count() or 1) * 2
+        pending = deque()
+        for chunk in iter_sessions(rows, chunk_size):
+            pending.append(pool.submit(replay_chunk, chunk))
+            if len(pending) >= max_pending:
+                _merge(total, pending.popleft().result())
+        while pending:
+            _merge(total, pending.popleft().result())
+    return summarize(total, time.perf_counter() - started)
+
+
+def main(argv: List[str] = None):
+    parser = argparse.ArgumentParser(description='Benchmark the extractors on recorded conversations')
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('--corpus', help='JSONL export of chat_messages')
+    source.add_argument('--from-db', action='store_true', help='read chat_messages from the database')
+    parser.add_argument('--workers', type=int, default=None, help='worker processes (default: CPU count)')
+    parser.add_argument('--chunk-size', type=int, default=200, help='sessions per work unit')
+    parser.add_argument('--json', action='store_true', help='print the report as JSON')
+    args = parser.parse_args(argv)
+
+    rows = read_chat_messages() if args.from_db else read_corpus(args.corpus)
+    report = replay(rows, args.workers, args.chunk_size)
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+
+    print(f"📊 {report['sessions']} sessions, {report['turns']} turns in {report['seconds']}s "
+          f"({report['turns_per_sec']} turns/sec)")
+    for name, stats in report['extractors'].items():
+        agreement = f"{stats['agreement'] * 100:.1f}% of {stats['compared']}" if stats['compared'] else 'n/a'
+        print(f"   {name}: {stats['calls']} calls, mean {stats['mean_us']}us, "
+              f"p95 {stats['p95_us']}us, agreement {agreement}")
+
+
+if __name__ == '__main__':
+    main()
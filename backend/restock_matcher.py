@@ -0,0 +1,170 @@
+"""Match pending contact requests against restocked products.
+
+Usage:
+    python restock_matcher.py --install     # create tables, indexes and triggers
+    python restock_matcher.py               # process restocks recorded since the last run
+    python restock_matcher.py --full        # treat every in-stock product as restocked
+
+A trigger on products records every reference whose quantity goes from zero
+(or nothing) to positive in restock_events. Each run consumes those events
+and, in one set-based statement, joins them with contact_requests on the
+normalized requested_part (which holds either the serial or the product name
+the customer asked for). Matches are queued in restock_notifications, one per
+contact request, so re-running never notifies a customer twice.
+
+The matching uses demand_normalize() from the demand rollup schema, so run
+`python demand_rollup.py --install` before installing the restock matcher.
+"""
+import argparse
+import sys
+import time
+from typing import Dict, List
+
+from db_manager import DatabaseManager
+
+SCHEMA_SQL = """
+    CREATE TABLE IF NOT EXISTS restock_events (
+        internal_reference TEXT PRIMARY KEY,
+        restocked_at TIMESTAMPTZ NOT NULL DEFAULT now()
+    );
+
+    CREATE TABLE IF NOT EXISTS restock_notifications (
+        id BIGSERIAL PRIMARY KEY,
+        contact_request_id INTEGER NOT NULL UNIQUE,
+        internal_reference TEXT NOT NULL,
+        product_name TEXT,
+        quantity_on_hand NUMERIC,
+        status TEXT NOT NULL DEFAULT 'queued',
+        created_at TIMESTAMPTZ NOT NULL DEFAULT now()
+    );
+    CREATE INDEX IF NOT EXISTS restock_notifications_status_idx
+        ON restock_notifications (status) WHERE status = 'queued';
+
+    CREATE INDEX IF NOT EXISTS contact_requests_part_key_idx
+        ON contact_requests (demand_normalize(requested_part));
+
+    CREATE OR REPLACE FUNCTION record_restock_event() RETURNS trigger AS $$
+    BEGIN
+        INSERT INTO restock_events (internal_reference)
+        VALUES (NEW.internal_reference)
+        ON CONFLICT (internal_reference) DO UPDATE SET restocked_at = now();
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql;
+
+    DROP TRIGGER IF EXISTS products_restock_insert ON products;
+    CREATE TRIGGER products_restock_insert
+        AFTER INSERT ON products
+        FOR EACH ROW WHEN (NEW.quantity_on_hand > 0)
+        EXECUTE FUNCTION record_restock_event();
+
+    DROP TRIGGER IF EXISTS products_restock_update ON products;
+    CREATE TRIGGER products_restock_update
+        AFTER UPDATE OF quantity_on_hand ON products
+        FOR EACH ROW WHEN (coalesce(OLD.quantity_on_hand, 0) <= 0 AND NEW.quantity_on_hand > 0)
+        EXECUTE FUNCTION record_restock_event();
+"""
+
+SEED_ALL_SQL = """
+    INSERT INTO restock_events (internal_reference)
+    SELECT internal_reference FROM products WHERE quantity_on_hand > 0
+    ON CONFLICT (internal_reference) DO NOTHING
+"""
+
+# A single equality join on the normalized key: the planner can probe
+# contact_requests_part_key_idx for a handful of restocks or hash join
+# the whole pending set when a large import restocks many products.
+MATCH_SQL = """
+    WITH consumed AS (
+        DELETE FROM restock_events RETURNING internal_reference
+    ),
+    restocked AS (
+        -- One row per lookup key: the serial and the product name
+        SELECT p.internal_reference, p.product_name, p.quantity_on_hand,
+               unnest(ARRAY[demand_normalize(p.internal_reference),
+                            demand_normalize(p.product_name)]) AS part_key
+        FROM products p
+        JOIN consumed USING (internal_reference)
+        WHERE p.quantity_on_hand > 0
+    ),
+    matches AS (
+        SELECT DISTINCT ON (c.id)
+               c.id AS contact_request_id, r.internal_reference, r.product_name, r.quantity_on_hand
+        FROM restocked r
+        JOIN contact_requests c
+          ON demand_normalize(c.requested_part) = r.part_key
+        WHERE NOT EXISTS (
+            SELECT 1 FROM restock_notifications n WHERE n.contact_request_id = c.id
+        )
+        ORDER BY c.id, r.quantity_on_hand DESC
+    ),
+    queued AS (
+        INSERT INTO restock_notifications
+            (contact_request_id, internal_reference, product_name, quantity_on_hand)
+        SELECT contact_request_id, internal_reference, product_name, quantity_on_hand
+        FROM matches
+        ON CONFLICT (contact_request_id) DO NOTHING
+        RETURNING 1
+    )
+    SELECT (SELECT count(*) FROM consumed) AS restocked,
+           (SELECT count(*) FROM queued) AS queued
+"""
+
+
+def install_restock_matcher(connection):
+    """Create the restock tables, indexes and triggers"""
+    with connection.cursor() as cursor:
+        # demand_normalize() comes from the demand rollup schema
+        cursor.execute("SELECT to_regprocedure('demand_normalize(text)')")
+        if cursor.fetchone()[0] is None:
+            connection.rollback()
+            raise RuntimeError("demand_normalize() is missing, run demand_rollup.py --install first")
+        cursor.execute(SCHEMA_SQL)
+    connection.commit()
+
+
+def match_restocks(connection, full: bool = False) -> Dict:
+    """Queue notifications for contact requests satisfied by restocked products"""
+    started = time.monotonic()
+    try:
+        with connection.cursor() as cursor:
+            if full:
+                cursor.execute(SEED_ALL_SQL)
+            cursor.execute(MATCH_SQL)
+            restocked, queued = cursor.fetchone()
+        connection.commit()
+    except Exception:
+        connection.rollback()
+        raise
+    return {
+        'restocked': restocked,
+        'queued': queued,
+        'seconds': round(time.monotonic() - started, 2),
+    }
+
+
+def main(argv: List[str] = None):
+    parser = argparse.ArgumentParser(description='Queue notifications for restocked parts')
+    parser.add_argument('--install', action='store_true', help='create tables, indexes and triggers')
+    parser.add_argument('--full', action='store_true', help='match against every in-stock product')
+    args = parser.parse_args(argv)
+
+    db = DatabaseManager()
+    try:
+        if args.install:
+            try:
+                install_restock_matcher(db.connection)
+            except RuntimeError as e:
+                print(f"❌ {e}")
+                sys.exit(1)
+            print("✅ Restock matcher installed")
+        summary = match_restocks(db.connection, full=args.full)
+    finally:
+        db.close()
+
+    print(f"✅ {summary['restocked']} restocked products, "
+          f"{summary['queued']} notifications queued in {summary['seconds']}s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,310 @@
+import argparse
+import json
+import select
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Set, Tuple
+
+import psycopg2
+from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT
+
+from config import Config
+
+NOTIFY_CHANNEL = 'product_changes'
+
+# Statement-level triggers publishing one notification per products statement.
+# The payload lists the affected references, or just {"bulk": true} when they
+# would not fit in a NOTIFY payload, so a bulk import clears the cache once.
+# Transition tables only allow one event per trigger, hence three triggers.
+# Installed with `python search_cache.py --install`; until then entries only
+# expire through their TTL.
+TRIGGER_SQL = f"""
+    CREATE OR REPLACE FUNCTION notify_product_change() RETURNS trigger AS $$
+    DECLARE
+        refs JSONB;
+        renamed JSONB;
+        payload TEXT;
+    BEGIN
+        IF TG_OP = 'INSERT' THEN
+            SELECT coalesce(jsonb_agg(DISTINCT internal_reference), '[]') INTO refs FROM new_rows;
+            renamed := refs;
+        ELSIF TG_OP = 'DELETE' THEN
+            SELECT coalesce(jsonb_agg(DISTINCT internal_reference), '[]') INTO refs FROM old_rows;
+            renamed := refs;
+        ELSE
+            SELECT coalesce(jsonb_agg(DISTINCT internal_reference), '[]') INTO refs FROM (
+                SELECT internal_reference FROM new_rows
+                UNION SELECT internal_reference FROM old_rows
+            ) changed;
+            SELECT coalesce(jsonb_agg(DISTINCT internal_reference), '[]') INTO renamed FROM (
+                (SELECT internal_reference, product_name FROM new_rows
+                 EXCEPT SELECT internal_reference, product_name FROM old_rows)
+                UNION ALL
+                (SELECT internal_reference, product_name FROM old_rows
+                 EXCEPT SELECT internal_reference, product_name FROM new_rows)
+            ) moved;
+        END IF;
+        IF jsonb_array_length(refs) = 0 THEN
+            RETURN NULL;
+        END IF;
+        payload := jsonb_build_object('refs', refs, 'renamed', renamed)::text;
+        IF length(payload) > 7000 THEN
+            payload := jsonb_build_object('bulk', TRUE, 'rows', jsonb_array_length(refs))::text;
+        END IF;
+        PERFORM pg_notify('{NOTIFY_CHANNEL}', payload);
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql;
+
+    DROP TRIGGER IF EXISTS products_notify_change ON products;
+    DROP TRIGGER IF EXISTS products_notify_insert ON products;
+    DROP TRIGGER IF EXISTS products_notify_update ON products;
+    DROP TRIGGER IF EXISTS products_notify_delete ON products;
+    CREATE TRIGGER products_notify_insert
+        AFTER INSERT ON products REFERENCING NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION notify_product_change();
+    CREATE TRIGGER products_notify_update
+        AFTER UPDATE ON products REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION notify_product_change();
+    CREATE TRIGGER products_notify_delete
+        AFTER DELETE ON products REFERENCING OLD TABLE AS old_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION notify_product_change();
+"""
+
+MISS = object()
+
+
+class SearchCache:
+    """Bounded LRU cache for search results with TTL and per-reference invalidation.
+
+    Each entry remembers the internal_references it returned, so a stock change
+    on one product drops exactly the cached searches that show that product.
+    Inserts, deletes and renames can change which rows a text search matches,
+    so they also drop every entry of the text-search kinds.
+
+    Readers take `generation` before querying the database and pass it to
+    put(); a value read while an invalidation ran is then not stored, since
+    the invalidation could not drop what was not cached yet.
+    """
+
+    def __init__(self, max_entries: int = 5000, ttl: float = 300):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[Tuple, Tuple[float, Any, Set[str]]]" = OrderedDict()
+        self._by_ref: Dict[str, Set[Tuple]] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self._generation = 0
+
+    @property
+    def generation(self) -> int:
+        """Bumped by every invalidation, see put()"""
+        return self._generation
+
+    def get(self, key: Tuple) -> Any:
+        """Return the cached value or MISS"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < now:
+                if entry is not None:
+                    self._remove(key)
+                self.misses += 1
+                return MISS
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key: Tuple, value: Any, refs: Iterable[str], generation: int = None):
+        """Store a value together with the product references it depends on.
+
+        When `generation` (taken before the value was read) is outdated, the
+        value may predate a change that was already invalidated, so it is dropped.
+        """
+        refs = {ref for ref in refs if ref}
+        with self._lock:
+            if generation is not None and generation != self._generation:
+                return
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (time.monotonic() + self.ttl, value, refs)
+            for ref in refs:
+                self._by_ref.setdefault(ref, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    def _remove(self, key: Tuple):
+        _, _, refs = self._entries.pop(key)
+        for ref in refs:
+            keys = self._by_ref.get(ref)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_ref[ref]
+
+    def invalidate_ref(self, ref: str):
+        """Drop every entry that contains or looks up this reference"""
+        with self._lock:
+            self._generation += 1
+            keys = set(self._by_ref.get(ref, ()))
+            for key in keys:
+                self._remove(key)
+            self.invalidations += len(keys)
+
+    def invalidate_kind(self, kind: Hashable):
+        """Drop every entry whose key starts with `kind`"""
+        with self._lock:
+            self._generation += 1
+            keys = [key for key in self._entries if key[0] == kind]
+            for key in keys:
+                self._remove(key)
+            self.invalidations += len(keys)
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self.invalidations += len(self._entries)
+            self._entries.clear()
+            self._by_ref.clear()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'invalidations': self.invalidations,
+            }
+
+
+class SearchCacheListener(threading.Thread):
+    """Background LISTEN connection that applies product change notifications"""
+
+    # Cache kinds whose results depend on product names rather than one reference
+    TEXT_SEARCH_KINDS = ('vehicle',)
+    # Past this many notifications in one poll, clearing everything is cheaper
+    MAX_BATCH = 100
+
+    def __init__(self, cache: SearchCache, poll_timeout: float = 5.0, retry_delay: float = 5.0):
+        super().__init__(name='search-cache-listener', daemon=True)
+        self.cache = cache
+        self.config = Config()
+        self.poll_timeout = poll_timeout
+        self.retry_delay = retry_delay
+        self._stop_event = threading.Event()
+        self.connected = False
+        self.subscribers: List[Callable[[Dict], None]] = []
+
+    def subscribe(self, callback: Callable[[Dict], None]):
+        """Also pass every change to `callback`: {'refs', 'renamed'} or {'bulk': True}"""
+        self.subscribers.append(callback)
+
+    def _connect(self):
+        connection = psycopg2.connect(
+            host=self.config.DB_HOST,
+            port=self.config.DB_PORT,
+            database=self.config.DB_NAME,
+            user=self.config.DB_USER,
+            password=self.config.DB_PASSWORD,
+            connect_timeout=self.config.DB_CONNECT_TIMEOUT
+        )
+        connection.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
+        with connection.cursor() as cursor:
+            cursor.execute(f"LISTEN {NOTIFY_CHANNEL}")
+        connection.notifies = deque()
+        return connection
+
+    def handle_batch(self, payloads: List[str]):
+        """Apply the notifications drained in one poll, clearing the cache at most once"""
+        changes = []
+        for payload in payloads:
+            try:
+                change = json.loads(payload)
+            except ValueError:
+                change = {'bulk': True}
+            changes.append(change)
+        if len(changes) > self.MAX_BATCH or any(change.get('bulk') for change in changes):
+            changes = [{'bulk': True}]
+
+        for change in changes:
+            if change.get('bulk'):
+                self.cache.clear()
+            else:
+                for ref in change.get('refs') or ():
+                    self.cache.invalidate_ref(ref)
+                if change.get('renamed'):
+                    for kind in self.TEXT_SEARCH_KINDS:
+                        self.cache.invalidate_kind(kind)
+            for callback in self.subscribers:
+                try:
+                    callback(change)
+                except Exception as e:
+                    print(f"Search cache subscriber error: {e}")
+
+    def run(self):
+        reconnecting = False
+        while not self._stop_event.is_set():
+            connection = None
+            try:
+                connection = self._connect()
+                if reconnecting:
+                    # Notifications may have been missed while disconnected
+                    self.handle_batch([json.dumps({'bulk': True})])
+                else:
+                    # Subscribers load their initial state themselves; a bulk
+                    # change here would only make them rebuild twice at startup
+                    self.cache.clear()
+                reconnecting = True
+                self.connected = True
+                print("✅ Search cache listening for product changes")
+                while not self._stop_event.is_set():
+                    if select.select([connection], [], [], self.poll_timeout) == ([], [], []):
+                        continue
+                    connection.poll()
+                    batch = []
+                    while connection.notifies:
+                        batch.append(connection.notifies.popleft().payload)
+                    if batch:
+                        self.handle_batch(batch)
+            except Exception as e:
+                self.connected = False
+                print(f"Search cache listener error: {e}")
+                self.cache.clear()
+                self._stop_event.wait(self.retry_delay)
+            finally:
+                if connection is not None and not connection.closed:
+                    connection.close()
+
+    def stop(self):
+        self._stop_event.set()
+
+
+def install_invalidation_triggers(connection):
+    """Create the products trigger that feeds SearchCacheListener"""
+    with connection.cursor() as cursor:
+        cursor.execute(TRIGGER_SQL)
+    connection.commit()
+
+
+def main(argv: List[str] = None):
+    parser = argparse.ArgumentParser(description='Maintain the search cache invalidation triggers')
+    parser.add_argument('--install', action='store_true', help='create the products NOTIFY triggers')
+    args = parser.parse_args(argv)
+    if not args.install:
+        parser.error('nothing to do, pass --install')
+
+    # db_manager imports this module
+    from db_manager import DatabaseManager
+    db = DatabaseManager()
+    try:
+        install_invalidation_triggers(db.connection)
+        print("✅ Search cache invalidation triggers installed")
+    finally:
+        db.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+import os
+import json
+import mimetypes
+import threading
+from typing import Dict, Optional, Tuple
+from flask import Response, request, send_from_directory
+
+from build_assets import MANIFEST_NAME, content_hash
+
+# Preferred order when the client accepts several encodings
+ENCODINGS = [('br', '.br'), ('gzip', '.gz')]
+
+
+class StaticAssetCache:
+    """Serve frontend files from memory with ETag and Cache-Control handling.
+
+    Files produced by build_assets.py are fingerprinted and can be cached
+    forever by the browser; everything else (index.html, unbuilt files) is
+    revalidated through its ETag so repeat loads end in a 304.
+    """
+
+    def __init__(self, frontend_dir: str, dist_dir: str, max_age: int = 31536000):
+        self.frontend_dir = frontend_dir
+        self.dist_dir = dist_dir
+        self.max_age = max_age
+        self.manifest = self._load_manifest()
+        self.immutable_paths = {entry['path'] for entry in self.manifest.get('assets', {}).values()}
+        # (file, encoding) -> (body, etag); None means the file exists but this
+        # encoded variant does not. Paths that do not resolve are never stored,
+        # so the cache stays bounded by the files on disk.
+        self._cache: Dict[Tuple[str, str], Optional[Tuple[bytes, str]]] = {}
+        self._lock = threading.Lock()
+
+    def _load_manifest(self) -> Dict:
+        """Load the build manifest, empty if the assets were never built"""
+        try:
+            with open(os.path.join(self.dist_dir, MANIFEST_NAME), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            print("⚠️ No static asset build found, serving frontend/ sources directly")
+            return {}
+
+    @property
+    def built(self) -> bool:
+        return bool(self.manifest)
+
+    def _resolve(self, path: str) -> Optional[str]:
+        """Map a request path to a file inside the dist or frontend directory"""
+        base = self.dist_dir if self.built else self.frontend_dir
+        full_path = os.path.abspath(os.path.join(base, path))
+        if not full_path.startswith(os.path.abspath(base) + os.sep):
+            return None
+        if not os.path.isfile(full_path) and self.built:
+            # Files that are not part of the build still come from frontend/
+            base = self.frontend_dir
+            full_path = os.path.abspath(os.path.join(base, path))
+            if not full_path.startswith(os.path.abspath(base) + os.sep):
+                return None
+        return full_path if os.path.isfile(full_path) else None
+
+    def _load(self, path: str, encoding: str) -> Optional[Tuple[bytes, str]]:
+        """Read a file variant once and keep it in memory"""
+        full_path = self._resolve(path)
+        if full_path is None:
+            return None
+
+        # Keyed on the resolved file so other spellings of a path share an entry
+        key = (full_path, encoding)
+        if key in self._cache:
+            return self._cache[key]
+
+        entry = None
+        suffix = dict(ENCODINGS).get(encoding, '')
+        variant = full_path + suffix
+        if os.path.isfile(variant):
+            with open(variant, 'rb') as f:
+                body = f.read()
+            etag = content_hash(body)
+            entry = (body, etag)
+
+        with self._lock:
+            self._cache[key] = entry
+        return entry
+
+    def _pick_encoding(self, path: str) -> str:
+        accepted = request.accept_encodings
+        for encoding, _ in ENCODINGS:
+            if accepted[encoding] and self._load(path, encoding) is not None:
+                return encoding
+        return 'identity'
+
+    def serve(self, path: str) -> Response:
+        """Serve a static path with compression, caching and 304 handling"""
+        encoding = self._pick_encoding(path)
+        entry = self._load(path, encoding)
+        if entry is None:
+            # Let Flask produce the usual 404
+            return send_from_directory(self.frontend_dir, path)
+
+        body, etag = entry
+        if path in self.immutable_paths:
+            cache_control = f'public, max-age={self.max_age}, immutable'
+        else:
+            cache_control = 'no-cache'
+
+        if request.if_none_match.contains(etag):
+            response = Response(status=304)
+        else:
+            mimetype = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+            response = Response(body, mimetype=mimetype)
+            if encoding != 'identity':
+                response.headers['Content-Encoding'] = encoding
+
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = cache_control
+        response.headers['Vary'] = 'Accept-Encoding'
+        return response
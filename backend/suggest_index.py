@@ -0,0 +1,212 @@
+import math
+import re
+import threading
+import time
+import unicodedata
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+NON_WORD_RE = re.compile(r'[^a-z0-9]+')
+
+# Index keys start at each of the first few words, so "huile" finds
+# "Filtre a huile ...", and are cut to bound memory on long names
+MAX_WORD_STARTS = 6
+KEY_CHARS = 48
+# Keys checked one by one for multi-word queries, keeps the worst case bounded
+MAX_SCAN = 2000
+WORD_START_PENALTY = 0.3
+
+KIND_BASE = {'query': 1.5, 'vehicle': 1.0, 'product': 1.0}
+
+
+def normalize(text: str) -> str:
+    """Lowercase, strip accents and collapse punctuation to single spaces"""
+    text = unicodedata.normalize('NFKD', (text or '').lower())
+    text = ''.join(ch for ch in text if not unicodedata.combining(ch))
+    return NON_WORD_RE.sub(' ', text).strip()
+
+
+class SuggestIndex:
+    """Sorted-array prefix index for typeahead over products, vehicles and popular searches.
+
+    Keys are kept in one sorted list, with parallel numpy arrays holding the
+    item and score of each key. A prefix maps to a contiguous key range
+    found with two bisects, and the best items in that range are picked with
+    argpartition. The index is rebuilt in the background and swapped in
+    whole, so lookups never wait on the database.
+
+    Rebuilds follow product changes (handle_change): at most one per
+    `refresh_interval` while the catalogue changes, otherwise one per
+    `max_age` to pick up new search statistics.
+    """
+
+    def __init__(self, refresh_interval: float = 300.0, max_age: float = 3600.0):
+        self.refresh_interval = refresh_interval
+        self.max_age = max_age
+        self._data = None
+        self._popular: List[str] = []
+        self._built_at = 0.0
+        self._changed = True
+        self._refreshing = threading.Lock()
+
+    @property
+    def built(self) -> bool:
+        return self._data is not None
+
+    def build(self, products: Iterable[Tuple[str, str, Optional[float]]],
+              vehicles: Iterable[Tuple[str, str, int]], queries: Iterable[Tuple[str, int]]):
+        """(Re)build from (ref, name, stock), (brand, model, searches) and (query, searches) rows"""
+        items: List[Dict] = []
+        scores: List[float] = []
+        seen = set()
+
+        query_counts: Dict[str, int] = {}
+        for text, requests in queries:
+            key = normalize(text)
+            if key:
+                query_counts[key] = query_counts.get(key, 0) + int(requests or 0)
+
+        def add(kind: str, text: str, score: float, **extra):
+            identity = (kind, normalize(text))
+            if not identity[1] or identity in seen:
+                return
+            seen.add(identity)
+            items.append({'text': text, 'type': kind, **extra})
+            scores.append(KIND_BASE[kind] + score)
+
+        for text, requests in sorted(query_counts.items(), key=lambda item: -item[1]):
+            add('query', text, math.log1p(requests))
+
+        vehicle_counts: Dict[str, Tuple[str, int]] = {}
+        for brand, model, requests in vehicles:
+            for text in filter(None, [brand, f"{brand} {model}" if brand and model else None]):
+                display = ' '.join(text.split()).title()
+                previous = vehicle_counts.get(normalize(display), (display, 0))
+                vehicle_counts[normalize(display)] = (display, previous[1] + int(requests or 0))
+        for display, requests in vehicle_counts.values():
+            add('vehicle', display, math.log1p(requests))
+
+        for ref, name, stock in products:
+            if not name:
+                continue
+            stock = float(stock or 0)
+            score = math.log1p(max(stock, 0)) * 0.5 - (0 if stock > 0 else 2)
+            score += math.log1p(query_counts.get(normalize(name), 0))
+            add('product', name, score, reference=ref, stock=int(stock) if stock.is_integer() else stock)
+
+        entries = []
+        for item_id, item in enumerate(items):
+            words = normalize(item['text']).split()
+            for position in range(min(len(words), MAX_WORD_STARTS)):
+                key = ' '.join(words[position:])[:KEY_CHARS]
+                entries.append((key, item_id, scores[item_id] - WORD_START_PENALTY * position))
+        entries.sort(key=lambda entry: entry[0])
+
+        keys = [entry[0] for entry in entries]
+        key_items = np.fromiter((entry[1] for entry in entries), dtype=np.int32, count=len(entries))
+        key_scores = np.fromiter((entry[2] for entry in entries), dtype=np.float32, count=len(entries))
+        item_texts = [normalize(item['text']) for item in items]
+        self._data = (keys, key_items, key_scores, items, item_texts)
+        # Queries were added most searched first
+        self._popular = [item['text'] for item in items if item['type'] == 'query'][:20]
+        self._built_at = time.monotonic()
+
+    def handle_change(self, change: Dict):
+        """SearchCacheListener callback: products changed, rebuild on the next refresh"""
+        self._changed = True
+
+    def refresh(self, loader: Callable[[], Tuple]):
+        """Rebuild from `loader()`, which returns the three build() sources"""
+        # Cleared first so a change notified during the load triggers another rebuild
+        self._changed = False
+        try:
+            self.build(*loader())
+        except Exception:
+            self._changed = True
+            raise
+
+    def refresh_async(self, loader: Callable[[], Tuple]) -> bool:
+        """Start a background rebuild if the index is stale and none is running"""
+        age = time.monotonic() - self._built_at
+        if self.built and (age < self.refresh_interval or (not self._changed and age < self.max_age)):
+            return False
+        if not self._refreshing.acquire(blocking=False):
+            return False
+
+        def run():
+            try:
+                self.refresh(loader)
+            except Exception as e:
+                print(f"⚠️ Could not rebuild suggestion index: {e}")
+                # Back off for a full interval before trying again
+                self._built_at = time.monotonic()
+            finally:
+                self._refreshing.release()
+
+        threading.Thread(target=run, name='suggest-index-refresh', daemon=True).start()
+        return True
+
+    def _range(self, keys: List[str], prefix: str) -> Tuple[int, int]:
+        prefix = prefix[:KEY_CHARS]
+        return bisect_left(keys, prefix), bisect_left(keys, prefix + '\uffff')
+
+    def _best(self, key_items, key_scores, lo: int, hi: int, count: int) -> np.ndarray:
+        """Key positions in [lo, hi) with the `count` highest scores, best first"""
+        scores = key_scores[lo:hi]
+        if len(scores) > count:
+            top = np.argpartition(-scores, count - 1)[:count]
+        else:
+            top = np.arange(len(scores))
+        return lo + top[np.argsort(-scores[top], kind='stable')]
+
+    def suggest(self, query: str, limit: int = 8) -> List[Dict]:
+        data = self._data
+        prefix = normalize(query)
+        if data is None or not prefix:
+            return []
+        keys, key_items, key_scores, items, item_texts = data
+
+        results, taken = [], set()
+
+        def take(positions, required_words=()):
+            for position in positions:
+                item_id = int(key_items[position])
+                if item_id in taken:
+                    continue
+                if any(word not in item_texts[item_id] for word in required_words):
+                    continue
+                taken.add(item_id)
+                results.append(items[item_id])
+                if len(results) >= limit:
+                    return True
+            return False
+
+        lo, hi = self._range(keys, prefix)
+        # Over-fetch: an item can own several keys in the same range
+        if lo < hi and take(self._best(key_items, key_scores, lo, hi, limit * MAX_WORD_STARTS)):
+            return results
+
+        # "filtre clio": anchor on the most selective word, require the others anywhere
+        words = prefix.split()
+        if len(words) > 1:
+            ranges = [(self._range(keys, word), word) for word in words]
+            (lo, hi), anchor = min(ranges, key=lambda r: r[0][1] - r[0][0])
+            if lo < hi:
+                take(self._best(key_items, key_scores, lo, hi, min(hi - lo, MAX_SCAN)),
+                     [word for word in words if word != anchor])
+        return results
+
+    def popular(self, limit: int = 5) -> List[str]:
+        """Most frequent successful part searches, for the quick-reply buttons"""
+        return [text.capitalize() for text in self._popular[:limit]]
+
+    def stats(self) -> Dict:
+        data = self._data
+        return {
+            'built': data is not None,
+            'items': len(data[3]) if data else 0,
+            'keys': len(data[0]) if data else 0,
+            'age_seconds': round(time.monotonic() - self._built_at, 1) if data else None,
+        }
@@ -92,6 +92,8 @@
         })();
 
         const CHAT_ENDPOINT = `${BASE_URL}/api/chat`;
+        const SUGGEST_ENDPOINT = `${BASE_URL}/api/suggest`;
+        const SUGGEST_DEBOUNCE_MS = 150;
 
         // === Enhanced IMOBOTChat class ===
         class IMOBOTChat {
@@ -102,7 +104,9 @@
                 this.partsFound = 0;
                 this.startTime = Date.now();
                 this.isTyping = false;
-                
+                this.pausedUntil = 0;
+                this.pauseTimer = null;
+
                 this._bindElements();
                 this._bindEvents();
                 this._showWelcomeMessage();
@@ -137,6 +141,122 @@
                 });
 
                 this.messagesContainer.addEventListener('click', () => this.messageInput.focus());
+
+                this._bindSuggest();
+            }
+
+            // === Typeahead suggestions ===
+            _bindSuggest() {
+                this.suggestList = document.createElement('ul');
+                this.suggestList.className = 'suggest-list';
+                this.suggestList.hidden = true;
+                this.messageInput.parentElement.appendChild(this.suggestList);
+                this.suggestItems = [];
+                this.suggestActive = -1;
+                this.suggestTimer = null;
+                this.suggestController = null;
+
+                this.messageInput.addEventListener('input', () => {
+                    clearTimeout(this.suggestTimer);
+                    this.suggestTimer = setTimeout(() => this._fetchSuggestions(), SUGGEST_DEBOUNCE_MS);
+                });
+
+                // Capture phase so a highlighted suggestion wins over the Enter-to-send handlers
+                this.messageInput.addEventListener('keydown', (e) => {
+                    if (this.suggestList.hidden) return;
+                    if (e.key === 'ArrowDown' || e.key === 'ArrowUp') {
+                        e.preventDefault();
+                        const step = e.key === 'ArrowDown' ? 1 : -1;
+                        const count = this.suggestItems.length;
+                        const start = this.suggestActive < 0 ? (step > 0 ? -1 : count) : this.suggestActive;
+                        this._highlightSuggestion((start + step + count) % count);
+                    } else if (e.key === 'Enter' && !e.shiftKey && this.suggestActive >= 0) {
+                        e.preventDefault();
+                        e.stopImmediatePropagation();
+                        this._pickSuggestion(this.suggestActive);
+                    } else if (e.key === 'Escape') {
+                        this._hideSuggestions();
+                    }
+                }, true);
+
+                this.messageInput.addEventListener('blur', () => this._hideSuggestions());
+            }
+
+            async _fetchSuggestions() {
+                const query = (this.messageInput.value || '').trim();
+                if (this.suggestController) this.suggestController.abort();
+                if (query.length < 2 || query.length > 60 || query.includes('\n')) {
+                    this._hideSuggestions();
+                    return;
+                }
+
+                this.suggestController = new AbortController();
+                try {
+                    const res = await fetch(`${SUGGEST_ENDPOINT}?q=${encodeURIComponent(query)}&limit=6`, {
+                        headers: { 'Accept': 'application/json' },
+                        signal: this.suggestController.signal,
+                    });
+                    if (!res.ok) return;
+                    const data = await res.json();
+                    // Drop answers for text the user has already changed
+                    if (data.query !== (this.messageInput.value || '').trim()) return;
+                    this._renderSuggest(data.suggestions || []);
+                } catch (err) {
+                    if (err.name !== 'AbortError') console.warn('Suggest error:', err);
+                }
+            }
+
+            _renderSuggest(items) {
+                this.suggestItems = items;
+                this.suggestActive = -1;
+                if (!items.length) {
+                    this._hideSuggestions();
+                    return;
+                }
+
+                const icons = { product: 'fa-cog', vehicle: 'fa-car', query: 'fa-search' };
+                this.suggestList.innerHTML = items.map((item, i) => {
+                    let stock = '';
+                    if (item.type === 'product') {
+                        const qty = Number(item.stock) || 0;
+                        stock = `<span class="suggest-stock ${qty > 0 ? '' : 'out'}">${qty > 0 ? `${qty} in stock` : 'out of stock'}</span>`;
+                    }
+                    return `<li class="suggest-item" data-index="${i}">
+                        <i class="fas ${icons[item.type] || 'fa-search'}"></i>
+                        <span>${this._escapeHtml(item.text)}</span>
+                        ${stock}
+                    </li>`;
+                }).join('');
+
+                this.suggestList.querySelectorAll('.suggest-item').forEach(li => {
+                    // mousedown fires before the textarea blur hides the list
+                    li.addEventListener('mousedown', (e) => {
+                        e.preventDefault();
+                        this._pickSuggestion(Number(li.dataset.index));
+                    });
+                });
+                this.suggestList.hidden = false;
+            }
+
+            _highlightSuggestion(index) {
+                this.suggestActive = index;
+                this.suggestList.querySelectorAll('.suggest-item').forEach((li, i) => {
+                    li.classList.toggle('active', i === index);
+                });
+            }
+
+            _pickSuggestion(index) {
+                const item = this.suggestItems[index];
+                this._hideSuggestions();
+                if (item) this._setInputAndFocus(item.text);
+            }
+
+            _hideSuggestions() {
+                clearTimeout(this.suggestTimer);
+                if (this.suggestController) this.suggestController.abort();
+                this.suggestList.hidden = true;
+                this.suggestItems = [];
+                this.suggestActive = -1;
             }
 
             _autoResize(textarea) {
@@ -236,11 +356,21 @@
 
             _hideTyping() {
                 this.isTyping = false;
-                this.sendBtn.disabled = false;
+                this.sendBtn.disabled = Date.now() < this.pausedUntil;
                 const el = document.getElementById('typing-indicator');
                 if (el) el.remove();
             }
 
+            _pauseSending(seconds) {
+                const ms = (seconds > 0 ? seconds : 5) * 1000;
+                this.pausedUntil = Date.now() + ms;
+                this.sendBtn.disabled = true;
+                clearTimeout(this.pauseTimer);
+                this.pauseTimer = setTimeout(() => {
+                    this.sendBtn.disabled = this.isTyping;
+                }, ms);
+            }
+
             _showToast(message, type = 'info', ms = 4000) {
                 const toast = document.createElement('div');
                 toast.className = `toast ${type}`;
@@ -255,10 +385,11 @@
 
             async sendMessage() {
                 const raw = (this.messageInput.value || '').trim();
-                if (!raw || this.isTyping) return;
+                if (!raw || this.isTyping || Date.now() < this.pausedUntil) return;
 
                 this._addMessage('user', raw);
                 this.messageInput.value = '';
+                this._hideSuggestions();
                 this._autoResize(this.messageInput);
                 this.messageCount++;
 
@@ -283,6 +414,15 @@
 
                     if (!res.ok) {
                         const errorText = await res.text().catch(() => '');
+                        if (res.status === 429 || res.status === 503) {
+                            // Rate limited or warming up: show the server's reply and hold off until Retry-After
+                            let reply = '';
+                            try { reply = JSON.parse(errorText).reply || ''; } catch (e) {}
+                            this._addMessage('bot', reply || '⏳ The server is busy. Please wait a moment and try again.');
+                            this.messageInput.value = raw;
+                            this._pauseSending(Number(res.headers.get('Retry-After')));
+                            return;
+                        }
                         console.error('Server error:', res.status, errorText);
                         this._addMessage('bot', `⚠️ Server error (${res.status}). Please try again.`);
                         this._showToast('Server error: ' + res.status, 'error');
@@ -310,6 +450,9 @@
                     this._displayParts(normalized);
                     const foundCount = (data.metadata && Number(data.metadata.total_found)) || normalized.length || 0;
                     this.partsFound += foundCount;
+                } else if (data.type === 'parts_table' && Array.isArray(data.data)) {
+                    this._displayPartsTable(data.data);
+                    this.partsFound += data.data.filter(row => row.found).length;
                 } else if (data.type === 'order' && data.data) {
                     this._displayOrder(data.data);
                 } else if (data.type === 'command' && data.data) {
@@ -393,6 +536,42 @@
                 this._scrollToBottom();
             }
 
+            _displayPartsTable(rows = []) {
+                if (!rows.length) return;
+
+                const wrap = document.createElement('div');
+                wrap.className = 'parts-table-wrap';
+
+                const body = rows.map(row => {
+                    const qty = Number(row.qty) || 0;
+                    const stockClass = !row.found || qty === 0 ? 'out' : (qty < 5 ? 'low' : '');
+                    const stockText = !row.found ? 'Not found' : (qty === 0 ? 'Out of stock' : qty);
+                    const price = (row.unit_price !== null && row.unit_price !== undefined && !isNaN(Number(row.unit_price)))
+                        ? `${Number(row.unit_price).toFixed(2)}`
+                        : '—';
+                    return `
+                        <tr class="${row.found ? '' : 'missing'}">
+                            <td>${this._escapeHtml(row.part_no || '')}</td>
+                            <td>${this._escapeHtml(row.description || '')}</td>
+                            <td class="part-stock ${stockClass}">${this._escapeHtml(String(stockText))}</td>
+                            <td class="part-price">${price}</td>
+                        </tr>
+                    `;
+                }).join('');
+
+                wrap.innerHTML = `
+                    <table class="parts-table">
+                        <thead>
+                            <tr><th>Reference</th><th>Product</th><th>Stock</th><th>Price (DZD)</th></tr>
+                        </thead>
+                        <tbody>${body}</tbody>
+                    </table>
+                `;
+
+                this.messagesContainer.appendChild(wrap);
+                this._scrollToBottom();
+            }
+
             _displayOrder(order = {}) {
                 const card = document.createElement('div');
                 card.className = 'order-card';